@@ -6,34 +6,78 @@ Date: April 2020
 
 """
 
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def factorLabels(prior):
+    ## the labels of one factor: the keys of a dict prior in insertion order, or the indices 0..n-1 of an array prior
+    return list(prior) if isinstance(prior, Mapping) else list(range(len(prior)))
+
+
+def factorArrays(priors, likelihood):
+    ## priors and likelihood in any mix of labeled (dict) and plain (array) forms -> label lists, prior arrays, likelihood array
+    labels = [factorLabels(prior) for prior in priors]
+    priorArrays = [np.array([prior[label] for label in labelsOfFactor], dtype=float) for prior, labelsOfFactor in zip(priors, labels)]
+    if isinstance(likelihood, Mapping):
+        labelIndex = [{label: i for i, label in enumerate(labelsOfFactor)} for labelsOfFactor in labels]
+        likelihoodArray = np.zeros([len(labelsOfFactor) for labelsOfFactor in labels])
+        if likelihood:
+            keys = np.array([[index[label] for index, label in zip(labelIndex, key)] for key in likelihood]).reshape(len(likelihood), -1)
+            likelihoodArray[tuple(keys.T)] = list(likelihood.values())
+    else:
+        likelihoodArray = np.asarray(likelihood, dtype=float)
+        factorShape = tuple(len(labelsOfFactor) for labelsOfFactor in labels)
+        if likelihoodArray.shape[likelihoodArray.ndim - len(labels):] != factorShape:
+            raise ValueError('likelihood of shape {} does not end in the factor sizes {}'.format(likelihoodArray.shape, factorShape))
+    return labels, priorArrays, likelihoodArray
+
+
+def labeledMarginal(labels, marginal):
+    ## {label: P}, with P a float for a single likelihood table and an array over the batch axes otherwise
+    if marginal.ndim == 1:
+        return dict(zip(labels, marginal.tolist()))
+    return {label: marginal[..., i] for i, label in enumerate(labels)}
+
+
+def getMarginalPosteriors(priors, likelihood):
+    """
+    Marginal posteriors of any number of independent latent factors.
+
+    priors: one prior per factor, each a dict {label: P} or a 1-D array; the
+    forms may be mixed.
+    likelihood: P(data | values of all factors), either a dict keyed by
+    tuples of labels (one per factor, in the order of priors; missing keys
+    have likelihood 0; an array prior's labels are its indices) or an array
+    of shape (..., n1, ..., nk). The last k axes follow the order of priors
+    and, along each axis, the insertion order of that factor's dict prior
+    (or the order of its array prior); leading axes index a batch of
+    likelihood tables.
+    Returns one marginal per factor, in the form of its prior: a dict
+    {label: P} (P an array over the batch axes, if any) or an array (..., ni).
+    """
+    if isinstance(likelihood, Mapping) or any(isinstance(prior, Mapping) for prior in priors):
+        labels, priorArrays, likelihoodArray = factorArrays(priors, likelihood)
+        marginals = getMarginalPosteriors(priorArrays, likelihoodArray)
+        return [labeledMarginal(labelsOfFactor, marginal) if isinstance(prior, Mapping) else marginal
+                for prior, labelsOfFactor, marginal in zip(priors, labels, marginals)]
+
+    numFactors = len(priors)
+    factorAxes = tuple(range(-numFactors, 0))
+    ## the joint is the likelihood times the outer product of the priors
+    joint = np.asarray(likelihood, dtype=float)
+    for i, prior in enumerate(priors):
+        shape = [1] * numFactors
+        shape[i] = -1
+        joint = joint * np.reshape(prior, shape)
+    marginalOfData = joint.sum(axis=factorAxes)
+    return [joint.sum(axis=tuple(axis for axis in factorAxes if axis != factorAxes[i])) / marginalOfData[..., None]
+            for i in range(numFactors)]
+
+
 def getPosterior(priorOfA, priorOfB, likelihood):
-	
-##################################################
-#		Your code here
-##################################################
-    marginalOfA= {key: None for key in priorOfA}
-    marginalOfB= {key: None for key in priorOfB}
-    temp ={key: None for key in likelihood}
-    #print (priorOfB)
-    
-    
-    for key, value in likelihood.items():
-        temp[key] = value * priorOfA[key[0]] * priorOfB[key[1]] 
-        #print(priorOfB[key[1]])
-    
-    marginalOfData=sum(temp.values())
-            
-    for a in marginalOfA:
-        
-        marginalOfA[a]= sum(d for k, d in temp.items() if k[0] == a) /marginalOfData
-    
-   
-    for b in marginalOfB:
-        
-        marginalOfB[b]= sum(d for k, d in temp.items() if k[1] == b) /marginalOfData            
-    
-
-    return([marginalOfA, marginalOfB])
+    return getMarginalPosteriors([priorOfA, priorOfB], likelihood)
 
 
 
@@ -48,6 +92,18 @@ def main():
     exampleTwoLikelihood = {('red', 'x'): 0.2, ('red', 'y'): 0.3, ('red', 'z'): 0.4, ('blue', 'x'): 0.08, ('blue', 'y'): 0.12, ('blue', 'z'): 0.16, ('green', 'x'): 0.24, ('green', 'y'): 0.36, ('green', 'z'): 0.48, ('purple', 'x'): 0.32, ('purple', 'y'): 0.48, ('purple', 'z'): 0.64}
     print(getPosterior(exampleTwoPriorofA, exampleTwoPriorofB, exampleTwoLikelihood))
 
+    ## array input: a batch of 4 likelihood tables over 3 latent factors with thousands of values each
+    random = np.random.RandomState(0)
+    priors = [random.dirichlet(np.ones(n)) for n in (1000, 800, 3)]
+    likelihood = random.rand(4, 1000, 800, 3)
+    marginals = getMarginalPosteriors(priors, likelihood)
+    print([marginal.shape for marginal in marginals], [float(marginal[0].sum()) for marginal in marginals])
+
+    ## labeled and plain forms mixed: a goal prior by name, the likelihood axes in the order of its keys
+    goalPrior = {'A': .5, 'B': .3, 'C': .2}
+    goalPosterior, environmentPosterior = getMarginalPosteriors([goalPrior, np.array([.5, .5])], random.rand(3, 2))
+    print(goalPosterior, environmentPosterior)
+
 
 
 
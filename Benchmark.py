@@ -0,0 +1,307 @@
+"""
+Benchmarks for the solvers on generated grid worlds
+
+Run as a script:
+    python Benchmark.py                         sparse model and policy iteration tables
+    python Benchmark.py --suite quick --output results.json [--baseline baseline.json]
+    python Benchmark.py --suite imports [--budget 0.5]
+
+The quick and full suites time every stage of the goal-inference pipeline on
+generated grids, deterministic and noisy, with 3 to 50 goals, through the
+public entry points and their table conversions:
+    MultiGoalValueIteration   all goals in one solve, returning value and policy tables
+    Qfunction                 the Qfunction table of every goal
+    PolicyGivenGoal           the PolicyGivenGoal table of every goal
+    GetLikelihoodReward       GetLikelihoodReward.rewardsForAllGoals, the signaling reward tables
+    posterior                 TrajectoryScorer goal posteriors of a batch of random tracks
+and write one JSON record per (case, stage) with wall time, peak traced
+memory, sweep count and states per second. Wall time comes from an untraced
+run, peak memory from a second run under tracemalloc. Cases whose tables
+would not fit in memory are listed as skipped. With --baseline, records are
+matched against a stored run and slowdowns beyond --tolerance are reported
+as regressions (exit status 1). Timings depend on the machine, so no
+baseline is kept in the repository: record one with --output on the machine
+that will run the checks, e.g.
+    python Benchmark.py --suite quick --output baseline.json
+and pass it as --baseline to later runs.
+
+The imports suite times a cold import of the solver and inference core in
+fresh interpreters and fails (exit status 1) if it takes longer than
+--budget seconds or loads matplotlib.
+
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from CompiledModel import MultiGoalValueIteration, compileModel, greedyBackup, solveValueIteration
+from GetLikelihoodReward import GetLikelihoodReward, PolicyGivenGoal, Qfunction
+from GoalInference import TrajectoryScorer
+from GridWorld import GridWorld, eightActions, makeRewardTable, makeTransitionTable
+from PolicyIteration import solveModifiedPolicyIteration, solvePolicyIteration
+from SparseModel import sparseModel
+
+
+suites = {
+    'quick': dict(gridSizes=(10, 50, 100), noises=(0., .2), goalCounts=(3, 10)),
+    'full': dict(gridSizes=(10, 50, 100, 200, 500), noises=(0., .2), goalCounts=(3, 10, 50)),
+}
+
+
+solverModules = ('GetLikelihoodReward', 'ValueIteration', 'BayesianInference')
+
+
+def benchmarkImports(modules=solverModules, repeats=5):
+    ## best of repeats cold imports in fresh interpreters: (seconds, plotting modules that got loaded)
+    script = ('import sys, time; start = time.perf_counter(); import {}; seconds = time.perf_counter() - start; '
+              'print(seconds, *sorted({{m.split(".")[0] for m in sys.modules}} & {{"matplotlib", "scipy"}}))').format(', '.join(modules))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        runs.append((float(output[0]), output[1:]))
+    return min(runs)
+
+
+def timeSweeps(model, expectedReward, gamma, numSweeps):
+    values = np.zeros(len(model.states))
+    start = time.perf_counter()
+    for _ in range(numSweeps):
+        values, maxActions = greedyBackup(model.qValues(expectedReward, values, gamma), -1000)
+    return (time.perf_counter() - start) / numSweeps
+
+
+def benchmarkSparseModel(gridSizes=(10, 25, 50, 100, 200), noise=.2, gamma=.9, numSweeps=10, denseLimit=2000):
+    ## memory and per-sweep time of the sparse model as the grid grows; the dense model is only built while it fits
+    print('{:>8} {:>8} {:>10} {:>14} {:>14} {:>14} {:>12} {:>12}'.format(
+        'grid', 'states', 'nnz', 'sparse bytes', 'peak build', 'dense bytes', 'sparse s/sw', 'dense s/sw'))
+    for size in gridSizes:
+        transitionTable = makeTransitionTable(size, size, noise=noise)
+        rewardTable = makeRewardTable(transitionTable, (size - 1, size - 1), [(size // 2, size // 2)])
+
+        tracemalloc.start()
+        model = sparseModel(transitionTable)
+        expectedReward = model.expectedReward(rewardTable)
+        peakSparse = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        sparseTime = timeSweeps(model, expectedReward, gamma, numSweeps)
+
+        numStates, numActions = model.shape
+        denseBytes = numStates * numActions * numStates * 8
+        denseTime = float('nan')
+        if numStates <= denseLimit:
+            denseModel = compileModel(transitionTable)
+            denseTime = timeSweeps(denseModel, denseModel.expectedReward(rewardTable), gamma, numSweeps)
+
+        print('{:>8} {:>8} {:>10} {:>14} {:>14} {:>14} {:>12.5f} {:>12.5f}'.format(
+            '{}x{}'.format(size, size), numStates, model.nnz, model.nbytes, peakSparse, denseBytes, sparseTime, denseTime))
+
+
+def solverRuns(model, expectedReward, convergenceTolerance, gamma, valueFloor, evaluationSweeps=(5, 20)):
+    ## (solver, iterations, seconds) for value iteration, policy iteration and modified policy iteration
+    solvers = [('value iteration', lambda: solveValueIteration(model, expectedReward, convergenceTolerance, gamma,
+                                                                valueFloor=valueFloor)),
+               ('policy iteration', lambda: solvePolicyIteration(model, expectedReward, gamma, valueFloor=valueFloor))]
+    solvers += [('modified PI k={}'.format(k), lambda k=k: solveModifiedPolicyIteration(
+                    model, expectedReward, convergenceTolerance, gamma, k, valueFloor=valueFloor))
+                for k in evaluationSweeps]
+    runs = []
+    for name, solve in solvers:
+        start = time.perf_counter()
+        values, maxActions, iterations = solve()
+        runs.append((name, iterations, time.perf_counter() - start))
+    return runs
+
+
+def benchmarkPolicyIteration(gridSizes=(50, 100, 200), noise=.2, gamma=.95, convergenceTolerance=10e-7):
+    ## iterations and wall time of the solvers on the goal-inference notebook environment and on larger grids
+    environments = []
+    transitionTable = makeTransitionTable(7, 6, allActions=eightActions)
+    rewardTable = makeRewardTable(transitionTable, (6, 4), [(3, 0), (3, 1), (3, 2), (3, 3)], blockedCost=-1,
+                                  additiveGoalReward=False)
+    model = sparseModel(transitionTable)
+    environments.append(('notebook 7x6', model, model.expectedReward(rewardTable), 0))
+    for size in gridSizes:
+        world = GridWorld(size, size, trapStates=[(size // 2, y) for y in range(size * 3 // 4)],
+                          goalStates={'goal': (size - 1, 0)}, noise=noise)
+        model = world.sparseModel()
+        environments.append(('{}x{}'.format(size, size), model, model.expectedReward(world.rewardData(model, 'goal')), -1000))
+
+    print('{:>14} {:>20} {:>11} {:>10}'.format('environment', 'solver', 'iterations', 'seconds'))
+    for name, model, expectedReward, valueFloor in environments:
+        for solver, iterations, seconds in solverRuns(model, expectedReward, convergenceTolerance, gamma, valueFloor):
+            print('{:>14} {:>20} {:>11} {:>10.4f}'.format(name, solver, iterations, seconds))
+
+
+def benchmarkCases(gridSizes, noises, goalCounts, maxGoalStates=2000000):
+    ## (gridSize, noise, numGoals) of every combination, split into those whose per-goal tables stay under
+    ## maxGoalStates (goals x states) and the skipped rest
+    cases = [(size, noise, numGoals) for size in gridSizes for noise in noises for numGoals in goalCounts]
+    return ([case for case in cases if case[0] * case[0] * case[2] <= maxGoalStates],
+            [case for case in cases if case[0] * case[0] * case[2] > maxGoalStates])
+
+
+def caseWorld(size, noise, numGoals, seed=0):
+    ## a wall of traps across the middle and numGoals goal states drawn from a fixed seed
+    random = np.random.RandomState(seed)
+    trapStates = [(size // 2, y) for y in range(size * 3 // 4)]
+    free = np.array([s for s in range(size * size) if (s // size, s % size) not in set(trapStates)])
+    goals = random.choice(free, size=min(numGoals, len(free)), replace=False)
+    return GridWorld(size, size, trapStates=trapStates, goalStates={g: (s // size, s % size) for g, s in enumerate(goals)},
+                     noise=noise)
+
+
+def randomTracks(model, numTracks, length, seed=0):
+    ## (numTracks, length) state indices of random walks: a random action, then a random successor of it
+    random = np.random.RandomState(seed)
+    rowOf = np.full(model.shape, -1)
+    rowOf[model.rowState, model.rowAction] = np.arange(len(model.rowState))
+    tracks = np.empty((numTracks, length), dtype=np.intp)
+    tracks[:, 0] = random.randint(len(model.states), size=numTracks)
+    for t in range(1, length):
+        rows = rowOf[tracks[:, t - 1], random.randint(model.shape[1], size=numTracks)]
+        rows = np.where(rows >= 0, rows, rowOf[tracks[:, t - 1]].max(axis=1))
+        lengths = model.indptr[rows + 1] - model.indptr[rows]
+        tracks[:, t] = model.indices[model.indptr[rows] + (random.rand(numTracks) * lengths).astype(np.intp)]
+    return tracks
+
+
+def measure(stage, case, work, run):
+    ## one benchmark record; work is the number of state updates the stage performs, given its result.
+    ## Peak memory comes from a traced run whose result is dropped, the wall time from a separate untraced run
+    tracemalloc.start()
+    run()
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    return result, dict(case, stage=stage, seconds=seconds, peakBytes=peakBytes, sweeps=None,
+                        statesPerSecond=work(result) / seconds if seconds > 0 else None)
+
+
+def benchmarkPipeline(size, noise, numGoals, gamma=.9, beta=2, alpha=5, convergenceTolerance=10e-7, numTracks=10000,
+                      trackLength=20):
+    ## the goal-inference pipeline as a user runs it: GridWorld tables in, dictionary tables out at every stage
+    world = caseWorld(size, noise, numGoals)
+    model = world.sparseModel()
+    goals = list(world.goalStates)
+    transitionTable = world.transitionTable
+    rewardTables = {goal: world.rewardTable(goal) for goal in goals}
+    numStates = len(model.states)
+    case = dict(grid='{}x{}'.format(size, size), states=numStates, noise=noise, goals=len(goals))
+
+    records = []
+    solver = MultiGoalValueIteration(transitionTable, rewardTables, convergenceTolerance, gamma, model=model)
+    solutions, record = measure('MultiGoalValueIteration', case, lambda result: numStates * len(goals) * solver.sweeps, solver)
+    record['sweeps'] = solver.sweeps
+    records.append(record)
+    valueTables = {goal: solutions[goal][0] for goal in goals}
+    del solutions
+
+    QTables, record = measure('Qfunction', case, lambda result: numStates * len(goals),
+                              lambda: {goal: Qfunction(transitionTable, rewardTables[goal], valueTables[goal], gamma)
+                                       for goal in goals})
+    records.append(record)
+    del QTables
+    goalPolicies, record = measure('PolicyGivenGoal', case, lambda result: numStates * len(goals),
+                                   lambda: {goal: PolicyGivenGoal(transitionTable, rewardTables[goal], valueTables[goal], gamma,
+                                                                  beta, model=model) for goal in goals})
+    records.append(record)
+    newRewards, record = measure('GetLikelihoodReward', case, lambda result: numStates * len(goals),
+                                 lambda: GetLikelihoodReward(transitionTable, goalPolicies, model=model).rewardsForAllGoals(
+                                     rewardTables, alpha))
+    records.append(record)
+    del newRewards
+
+    tracks = randomTracks(model, numTracks, trackLength)
+    posterior, record = measure('posterior', case, lambda result: tracks.size,
+                                lambda: TrajectoryScorer(transitionTable, goalPolicies, model=model).logPosterior(tracks))
+    records.append(record)
+    return records
+
+
+def runSuite(gridSizes, noises, goalCounts, **parameters):
+    records = []
+    cases, skippedCases = benchmarkCases(gridSizes, noises, goalCounts)
+    for size, noise, numGoals in cases:
+        for record in benchmarkPipeline(size, noise, numGoals, **parameters):
+            print('{grid:>8} noise={noise:<4} goals={goals:<3} {stage:>23} {seconds:9.4f}s {peakBytes:>12} bytes'.format(**record))
+            records.append(record)
+    skipped = [dict(grid='{}x{}'.format(size, size), noise=noise, goals=numGoals) for size, noise, numGoals in skippedCases]
+    for case in skipped:
+        print('{grid:>8} noise={noise:<4} goals={goals:<3} {stage:>23}'.format(stage='skipped', **case))
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'records': records, 'skipped': skipped}
+
+
+def recordKey(record):
+    return (record['grid'], record['noise'], record['goals'], record['stage'])
+
+
+def compareWithBaseline(results, baseline, tolerance=.25, minSeconds=.01):
+    """
+    Regressions of results against a baseline run: a stage that is more than
+    tolerance slower (ignored below minSeconds, where timings are noise) or
+    uses more than tolerance more peak memory, or whose sweep count changed.
+    """
+    baselineRecords = {recordKey(record): record for record in baseline['records']}
+    regressions = []
+    for record in results['records']:
+        old = baselineRecords.get(recordKey(record))
+        if old is None:
+            continue
+        for field in ('seconds', 'peakBytes'):
+            if field == 'seconds' and record[field] < minSeconds:
+                continue
+            if record[field] > old[field] * (1 + tolerance):
+                regressions.append('{} {}: {:.4g} -> {:.4g}'.format(recordKey(record), field, old[field], record[field]))
+        if record['sweeps'] != old['sweeps']:
+            regressions.append('{} sweeps: {} -> {}'.format(recordKey(record), old['sweeps'], record['sweeps']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks on generated grid worlds')
+    parser.add_argument('--suite', choices=['tables', 'imports'] + sorted(suites), default='tables')
+    parser.add_argument('--output', help='write the suite results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=.25, help='allowed relative slowdown before a regression is reported')
+    parser.add_argument('--budget', type=float, default=.5, help='seconds allowed for a cold import of the solver core')
+    arguments = parser.parse_args()
+
+    if arguments.suite == 'imports':
+        seconds, heavyModules = benchmarkImports()
+        print('import {}: {:.3f}s (budget {:.3f}s){}'.format(', '.join(solverModules), seconds, arguments.budget,
+                                                           ', loaded ' + ', '.join(heavyModules) if heavyModules else ''))
+        if seconds > arguments.budget or heavyModules:
+            sys.exit(1)
+        return
+
+    if arguments.suite == 'tables':
+        benchmarkSparseModel()
+        benchmarkPolicyIteration()
+        return
+
+    results = runSuite(**suites[arguments.suite])
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            regressions = compareWithBaseline(results, json.load(f), arguments.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
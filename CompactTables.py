@@ -0,0 +1,215 @@
+"""
+Compact value, Q and policy tables
+
+Read-only dict-like views over contiguous arrays, for grids where nested
+dictionaries of Python floats no longer fit in memory:
+    CompactValueTable     valueTable[s]       -> float, backed by values[S]
+    CompactActionTable    table[s][a]         -> float, backed by array[S, A] and a mask of the entries present
+Lookups go through the model's state and action index maps, so code written
+against the dictionaries (valueTable[(x, y)], policyTable[s].items(), ...)
+keeps working, while the storage is one float32 or float64 array per table
+(4 or 8 bytes per entry instead of 100+). The solvers accept a
+CompactValueTable wherever they take a valueTable (the dict ValueIteration
+copies it into a dict, which it updates in place), and the consumers of
+policy tables (goal inference, GetLikelihoodReward, the trajectory simulator,
+GridPlot) accept a CompactActionTable; checkCompactConsumers runs the
+compact tables through all of them.
+
+float32 error bounds. Solves always run in float64; only the stored result
+is rounded, to nearest, so every entry is within half a float32 ulp of the
+float64 value:
+    |x32 - x64| <= 2**-24 * |x64|          (about 6e-8 relative)
+That is 6e-6 for a value of 100 and below 3e-8 for a probability, so float32
+value tables differ from float64 ones by less than the usual convergence
+tolerance of 10e-7 only where |V| < 16; the rows of a float32 policy sum to 1
+within A * 2**-25. Tied actions are decided in float64 before rounding, so
+compact policies have exactly the same support as the dictionaries.
+Q tables and Boltzmann policies computed from a float32 value table inherit
+its error on top of their own rounding:
+    |dQ| <= gamma * max|dV| + 2**-24 * |Q|       |dpi| <= 2 * beta * max|dQ|
+
+"""
+from collections.abc import Mapping
+import sys
+
+import numpy as np
+
+
+class CompactValueTable(Mapping):
+    def __init__(self, states, stateIndex, values, dtype=np.float32):
+        self.states = states
+        self.stateIndex = stateIndex
+        self.array = np.ascontiguousarray(values, dtype=dtype)
+
+    def __getitem__(self, s):
+        return float(self.array[self.stateIndex[s]])
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, s):
+        return s in self.stateIndex
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+
+class CompactActionRow(Mapping):
+    ## the {action: value} entries of one state
+    def __init__(self, table, i):
+        self.table = table
+        self.i = i
+
+    def __getitem__(self, action):
+        j = self.table.actionIndex[action]
+        if not self.table.mask[self.i, j]:
+            raise KeyError(action)
+        return float(self.table.array[self.i, j])
+
+    def __iter__(self):
+        return (self.table.actions[j] for j in np.flatnonzero(self.table.mask[self.i]))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.table.mask[self.i]))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactActionTable(Mapping):
+    """
+    {s: {a: x}} over an (S, A) array; mask marks the (s, a) entries the
+    dictionary form would contain (the valid actions of a Q table, the tied
+    actions of a greedy policy).
+    """
+    def __init__(self, states, stateIndex, actions, array, mask, dtype=np.float32):
+        self.states = states
+        self.stateIndex = stateIndex
+        self.actions = list(actions)
+        self.actionIndex = {action: j for j, action in enumerate(self.actions)}
+        self.array = np.ascontiguousarray(np.where(mask, array, 0), dtype=dtype)
+        self.mask = np.asarray(mask, dtype=bool)
+
+    def __getitem__(self, s):
+        return CompactActionRow(self, self.stateIndex[s])
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, s):
+        return s in self.stateIndex
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes + self.mask.nbytes
+
+
+def dictionaryBytes(table):
+    ## approximate bytes held by a (nested) dictionary table, for comparison with the compact forms
+    total = sys.getsizeof(table)
+    for s, entry in table.items():
+        total += sys.getsizeof(s) + sys.getsizeof(entry)
+        if isinstance(entry, dict):
+            total += sum(sys.getsizeof(a) + sys.getsizeof(x) for a, x in entry.items())
+    return total
+
+
+def checkCompactConsumers(gamma=.9, beta=.5, convergenceTolerance=10e-7, bound=1e-5):
+    """
+    Feeds the float32 tables and the dictionaries of the 7x6 example through
+    every consumer of value and policy tables and checks that the results
+    agree within bound, relative to their largest entry. beta is kept small
+    enough that no policy entry underflows in float32. Returns the errors.
+    """
+    from CompiledModel import MultiGoalValueIteration
+    from GetLikelihoodReward import GetLikelihoodReward, PolicyGivenGoal, Qfunction
+    from GoalInference import GoalInferenceStream, TrajectoryScorer, trajectoryLogPosterior
+    from GridPlot import policyArrows, valueGrid
+    from GridWorld import makeRewardTable, makeTransitionTable
+    from JointInference import GoalEnvironmentScorer
+    from SparseModel import sparseModel
+    from TrajectorySimulator import TrajectorySimulator
+    from ValueIteration import ValueIteration
+
+    transition = makeTransitionTable(7, 6, noise=.1)
+    model = sparseModel(transition)
+    goalStates = {'A': (6,1), 'B': (6,4), 'C': (1,5)}
+    rewards = {goal: makeRewardTable(transition, goalState, [(3,0), (3,1), (3,3)]) for goal, goalState in goalStates.items()}
+    track = [(0,0), (1,0), (1,1), (2,1), (2,2), (3,2), (4,2), (5,2), (5,1), (6,1)]
+
+    def consumerResults(dtype):
+        solutions = MultiGoalValueIteration(transition, rewards, convergenceTolerance, gamma, model=model, dtype=dtype)()
+        valueTables = {goal: solutions[goal][0] for goal in rewards}
+        policies = {goal: PolicyGivenGoal(transition, rewards[goal], valueTables[goal], gamma, beta, model=model, dtype=dtype)
+                    for goal in rewards}
+        stream = GoalInferenceStream(transition, policies, model=model)
+        for s in track:
+            stream.observe([s])
+        x, y, dx, dy = policyArrows(policies['A'], model.states, model.actions)
+        arrows = np.zeros((7, 6, 2))
+        np.add.at(arrows, (x.astype(int), y.astype(int)), np.stack([dx, dy], axis=-1))
+        signalingRewards = GetLikelihoodReward(transition, policies, model=model).rewardsForAllGoals(rewards, 5)
+        return {'PolicyGivenGoal': np.stack([model.policyArray(policies[goal]) for goal in rewards]),
+                'Qfunction': model.policyArray(Qfunction(transition, rewards['A'], valueTables['A'], gamma)),
+                'trajectoryLogPosterior': trajectoryLogPosterior(transition, track, policies, model=model),
+                'GoalInferenceStream': stream.logPosterior,
+                'TrajectoryScorer': TrajectoryScorer(transition, policies, model=model).logPosterior([track]),
+                'GoalEnvironmentScorer': GoalEnvironmentScorer(transition, {'map': policies}, model=model).marginals([track])[0],
+                'GetLikelihoodReward': np.stack([model.rewardData(signalingRewards[goal]) for goal in rewards]),
+                'TrajectorySimulator': TrajectorySimulator(transition, policies['A'], [goalStates['A']], model=model).actionCDF,
+                'valueGrid': valueGrid(7, 6, valueTables['A']),
+                'policyArrows': arrows,
+                ## last: the dict solver updates a dict valueTable in place
+                'ValueIteration': model.valueArray(ValueIteration(transition, rewards['A'], valueTables['A'],
+                                                                  convergenceTolerance, gamma)()[0])}
+
+    reference, compact = consumerResults(None), consumerResults(np.float32)
+    errors = {}
+    for consumer in reference:
+        finite = np.isfinite(reference[consumer])
+        assert np.array_equal(finite, np.isfinite(compact[consumer])), consumer
+        difference = np.abs(reference[consumer][finite] - compact[consumer][finite])
+        errors[consumer] = float(difference.max(initial=0) / max(1., np.abs(reference[consumer][finite]).max(initial=0)))
+        assert errors[consumer] < bound, (consumer, errors[consumer])
+    return errors
+
+
+def main():
+    from CompiledModel import solveValueIteration
+    from GridWorld import GridWorld, eightActions
+
+    world = GridWorld(200, 200, eightActions, trapStates=[(100, y) for y in range(150)], goalStates={'A': (199, 0)}, noise=.1)
+    model = world.sparseModel()
+    expectedReward = model.expectedReward(world.rewardData(model, 'A'))
+    gamma = .95
+
+    ## the same solution as dictionaries (SparseValueIteration(...)()) and as float32 tables (dtype=np.float32)
+    values, maxActions, sweeps = solveValueIteration(model, expectedReward, 10e-7, gamma)
+    valueTable, policyTable = model.solutionTables(values, maxActions)
+    compactValues, compactPolicy = model.solutionTables(values, maxActions, np.float32)
+    Q = model.qValues(expectedReward, values, gamma)
+
+    print('{:>14} {:>14} {:>14}'.format('table', 'dict bytes', 'float32 bytes'))
+    for name, table, compact in (('values', valueTable, compactValues), ('greedy policy', policyTable, compactPolicy),
+                                 ('Q', model.actionTable(Q), model.compactActionTable(Q))):
+        print('{:>14} {:>14} {:>14}'.format(name, dictionaryBytes(table), compact.nbytes))
+
+    relativeError = np.abs(compactValues.array - values) / np.maximum(np.abs(values), np.finfo(float).tiny)
+    print('max relative value error {:.2e} (bound {:.2e}), V(0,0) = {} / {}'.format(
+        relativeError.max(), 2 ** -24, valueTable[(0, 0)], compactValues[(0, 0)]))
+    print('policy at (0,0):', policyTable[(0, 0)], compactPolicy[(0, 0)])
+
+    ## the float32 tables in place of the dictionaries, through every consumer
+    for consumer, error in checkCompactConsumers().items():
+        print('{:>24} relative error {:.2e}'.format(consumer, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Compiled model: array form of the nested transition/reward dictionaries
+
+The dictionaries used throughout the project are of the form
+    transitionTable[s][a][s'] = P(s'|s,a)
+    rewardTable[s][a][s'] = R(s,a,s')
+compileModel turns them into index maps plus dense P[s,a,s'] and R[s,a,s']
+arrays, so that one Bellman sweep becomes a single batched matrix product.
+
+"""
+import numpy as np
+
+from CompactTables import CompactActionTable, CompactValueTable
+from LogPolicy import boltzmannPolicies
+from Telemetry import checkIterationLimit
+
+
+class CompiledModel(object):
+    def __init__(self, transitionTable):
+        self.indexModel(transitionTable)
+
+        numStates, numActions = self.shape
+        self.transitionMatrix = np.zeros((numStates, numActions, numStates))
+        for s, actionDict in transitionTable.items():
+            i = self.stateIndex[s]
+            for action, snewP in actionDict.items():
+                j = self.actionIndex[action]
+                for snew, P in snewP.items():
+                    self.transitionMatrix[i, j, self.stateIndex[snew]] += P
+
+    def indexModel(self, transitionTable):
+        self.states = list(transitionTable)
+        self.stateIndex = {s: i for i, s in enumerate(self.states)}
+
+        self.actions = []
+        self.actionIndex = {}
+        for s, actionDict in transitionTable.items():
+            for action in actionDict:
+                if action not in self.actionIndex:
+                    self.actionIndex[action] = len(self.actions)
+                    self.actions.append(action)
+
+        self.validActions = np.zeros((len(self.states), len(self.actions)), dtype=bool)
+        for s, actionDict in transitionTable.items():
+            for action in actionDict:
+                self.validActions[self.stateIndex[s], self.actionIndex[action]] = True
+
+    @property
+    def shape(self):
+        return (len(self.states), len(self.actions))
+
+    @property
+    def nbytes(self):
+        return self.transitionMatrix.nbytes + self.validActions.nbytes
+
+    def rewardMatrix(self, rewardTable):
+        ## R[s,a,s'] as a dense array, zero where the transition does not exist
+        R = np.zeros(self.transitionMatrix.shape)
+        for s, actionDict in rewardTable.items():
+            i = self.stateIndex[s]
+            for action, snewR in actionDict.items():
+                j = self.actionIndex[action]
+                for snew, r in snewR.items():
+                    R[i, j, self.stateIndex[snew]] = r
+        return R
+
+    def expectedReward(self, rewardTable):
+        ## R[s,a] = sum_s' P(s'|s,a) R(s,a,s')
+        return np.einsum('ijk,ijk->ij', self.transitionMatrix, self.rewardMatrix(rewardTable))
+
+    def expectedNextValue(self, values):
+        ## sum_s' P(s'|s,a) V(s'), for values of shape (..., S) -> (..., S, A)
+        numStates, numActions = self.shape
+        flatTransition = self.transitionMatrix.reshape(numStates * numActions, numStates)
+        nextValue = np.asarray(values) @ flatTransition.T
+        return nextValue.reshape(nextValue.shape[:-1] + (numStates, numActions))
+
+    def qValues(self, expectedReward, values, gamma):
+        Q = expectedReward + gamma * self.expectedNextValue(values)
+        return np.where(self.validActions, Q, -np.inf)
+
+    def actionTable(self, Q):
+        ## {s: {a: Q[s,a]}} over the valid actions, the nested form of Qfunction and PolicyGivenGoal
+        return {s: {self.actions[j]: float(Q[i, j]) for j in np.flatnonzero(self.validActions[i])}
+                for i, s in enumerate(self.states)}
+
+    def policyArray(self, policyTable):
+        ## pi[s,a] from a policy dictionary, zero for actions the table leaves out
+        if isinstance(policyTable, CompactActionTable) and policyTable.states is self.states:
+            return policyTable.array.astype(float)
+        pi = np.zeros(self.shape)
+        for s, actionDict in policyTable.items():
+            i = self.stateIndex[s]
+            for action, prob in actionDict.items():
+                pi[i, self.actionIndex[action]] = prob
+        return pi
+
+    def valueArray(self, valueTable):
+        if isinstance(valueTable, CompactValueTable) and valueTable.states is self.states:
+            return valueTable.array.astype(float)
+        return np.array([valueTable[s] for s in self.states], dtype=float)
+
+    def valueTable(self, values):
+        return {s: float(v) for s, v in zip(self.states, values)}
+
+    def policyTable(self, values, maxActions):
+        ## uniform over the tied maximizing actions; states with value 0 get an empty policy, as in ValueIteration
+        policyTable = {}
+        for i, s in enumerate(self.states):
+            policyTable[s] = {}
+            if values[i] != 0:
+                idx = np.flatnonzero(maxActions[i])
+                for j in idx:
+                    policyTable[s][self.actions[j]] = 1. / len(idx)
+        return policyTable
+
+    def compactValueTable(self, values, dtype=np.float32):
+        return CompactValueTable(self.states, self.stateIndex, values, dtype)
+
+    def compactActionTable(self, Q, dtype=np.float32):
+        ## compact form of actionTable: Q values or action probabilities over the valid actions
+        return CompactActionTable(self.states, self.stateIndex, self.actions, Q, self.validActions, dtype)
+
+    def compactPolicyTable(self, values, maxActions, dtype=np.float32):
+        ## compact form of policyTable
+        mask = maxActions & (values != 0)[:, None]
+        return CompactActionTable(self.states, self.stateIndex, self.actions, greedyPolicy(values, maxActions), mask, dtype)
+
+    def solutionTables(self, values, maxActions, dtype=None):
+        ## [valueTable, policyTable] as dictionaries, or as compact tables of the given dtype
+        if dtype is None:
+            return [self.valueTable(values), self.policyTable(values, maxActions)]
+        return [self.compactValueTable(values, dtype), self.compactPolicyTable(values, maxActions, dtype)]
+
+
+def compileModel(transitionTable):
+    return CompiledModel(transitionTable)
+
+
+def compiledQfunction(model, rewardTable, valueTable, gamma=0.95, dtype=None):
+    ## same QTable dictionary as Qfunction, computed in one batched backup; a compact table if dtype is given
+    Q = model.qValues(model.expectedReward(rewardTable), model.valueArray(valueTable), gamma)
+    return model.actionTable(Q) if dtype is None else model.compactActionTable(Q, dtype)
+
+
+def tableArray(table, fill=-np.inf):
+    ## (states, actions, array[s, a]) of a nested {s: {a: x}} table, fill where a state lacks an action
+    states = list(table)
+    actions = list(dict.fromkeys(action for s in states for action in table[s]))
+    actionIndex = {action: j for j, action in enumerate(actions)}
+    array = np.full((len(states), len(actions)), fill)
+    for i, s in enumerate(states):
+        for action, x in table[s].items():
+            array[i, actionIndex[action]] = x
+    return states, actions, array
+
+
+def greedyBackup(Q, valueFloor):
+    """
+    Vectorized form of the action selection in ValueIteration.__call__: actions
+    are compared on Q values rounded to 3 decimals, starting from
+    maxVal = valueFloor, and every action tied with the rounded maximum is kept.
+    The new value is the exact maximum Q rather than the Q of the first tied
+    action, which keeps the backup a contraction: picking the first of several
+    near-equal actions can otherwise cycle between sweeps forever.
+    Returns the new values and the mask of tied actions.
+    """
+    roundedQ = np.round(Q, 3)
+    roundedFloor = np.round(valueFloor, 3)
+    bestRounded = np.maximum(roundedQ.max(axis=-1), roundedFloor)
+    maxActions = roundedQ == bestRounded[..., None]
+
+    values = np.where(bestRounded > roundedFloor, Q.max(axis=-1), valueFloor)
+    return values, maxActions
+
+
+def greedyPolicy(values, maxActions):
+    ## array form of policyTable: uniform over the tied actions, all zero where the value is 0
+    policy = maxActions / np.maximum(maxActions.sum(axis=-1, keepdims=True), 1)
+    return np.where((values != 0)[..., None], policy, 0.)
+
+
+def solveValueIteration(model, expectedReward, convergenceTolerance, gamma, values=None, valueFloor=-1000,
+                        maxIterations=None, telemetry=None, returnQ=False):
+    """
+    Synchronous (Jacobi) value iteration on a compiled model. expectedReward may
+    carry leading batch axes, e.g. (G, S, A) for G reward tables solved together.
+    Returns the converged values, the tied-action mask and the number of sweeps,
+    and with returnQ the Q array (..., S, A) of the last sweep as well.
+    telemetry and maxIterations are described in Telemetry.py; with a batch,
+    statesUpdated and policyChanges count (batch, state) pairs.
+    """
+    if values is None:
+        values = np.zeros(expectedReward.shape[:-1])
+    values = np.broadcast_to(values, expectedReward.shape[:-1]).astype(float)
+
+    sweeps = 0
+    maxActions = None
+    if telemetry is not None:
+        telemetry.start()
+    while True:
+        Q = model.qValues(expectedReward, values, gamma)
+        newValues, newMaxActions = greedyBackup(Q, valueFloor)
+        delta = np.max(np.abs(newValues - values)) if newValues.size else 0.
+        if telemetry is not None:
+            policyChanges = newValues.size if maxActions is None else np.count_nonzero((newMaxActions != maxActions).any(axis=-1))
+            telemetry.recordSweep(delta, np.count_nonzero(newValues != values), policyChanges)
+        values, maxActions = newValues, newMaxActions
+        sweeps += 1
+        if delta < convergenceTolerance:
+            break
+        checkIterationLimit(sweeps, delta, maxIterations)
+
+    if returnQ:
+        return values, maxActions, sweeps, Q
+    return values, maxActions, sweeps
+
+
+class VectorizedValueIteration(object):
+    """
+    Drop-in replacement for ValueIteration that runs each sweep as a batched
+    matrix operation over a CompiledModel and returns the same
+    [valueTable, policyTable] dictionaries, or compact float32/float64 tables
+    (see CompactTables.py) when dtype is given.
+
+    valueFloor is the initial maxVal of the per-state action search: 0 in
+    ValueIteration.py and the goal-inference notebook, -1000 in
+    GetLikelihoodReward.py.
+
+    The Q array of the last sweep is kept in Q, indexed like model.states and
+    model.actions, and for every beta in betas its Boltzmann policy in
+    boltzmannPolicies[beta], so no separate Qfunction pass (with a gamma of
+    its own) is needed. Q is one backup behind the returned values, which is
+    within gamma * convergenceTolerance.
+    """
+    def __init__(self, transitionTable, rewardTable, convergenceTolerance, gamma, valueTable=None, valueFloor=-1000, model=None,
+                 maxIterations=None, telemetry=None, dtype=None, betas=None):
+        self.model = model if model is not None else compileModel(transitionTable)
+        self.rewardTable = rewardTable
+        self.valueTable = valueTable if valueTable is not None else dict.fromkeys(transitionTable, 0)
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.valueFloor = valueFloor
+        self.maxIterations = maxIterations
+        self.telemetry = telemetry
+        self.dtype = dtype
+        self.betas = betas
+
+    def __call__(self):
+        expectedReward = self.model.expectedReward(self.rewardTable)
+        values, maxActions, self.sweeps, self.Q = solveValueIteration(
+            self.model, expectedReward, self.convergenceTolerance, self.gamma, self.model.valueArray(self.valueTable),
+            self.valueFloor, self.maxIterations, self.telemetry, returnQ=True)
+        self.boltzmannPolicies = boltzmannPolicies(self.Q, self.betas or ())
+
+        return self.model.solutionTables(values, maxActions, self.dtype)
+
+
+class MultiGoalValueIteration(object):
+    """
+    Solves one transition model against a stack of G reward tables in a single
+    batched value iteration, with the goal as the leading array axis.
+    rewardTables maps goal -> rewardTable; calling returns goal -> [valueTable, policyTable],
+    as compact tables when dtype is given. Q and boltzmannPolicies are kept as
+    in VectorizedValueIteration, with the goals (in rewardTables order) as the
+    leading axis.
+    """
+    def __init__(self, transitionTable, rewardTables, convergenceTolerance, gamma, valueFloor=-1000, model=None,
+                 maxIterations=None, telemetry=None, dtype=None, betas=None):
+        self.model = model if model is not None else compileModel(transitionTable)
+        self.rewardTables = rewardTables
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.valueFloor = valueFloor
+        self.maxIterations = maxIterations
+        self.telemetry = telemetry
+        self.dtype = dtype
+        self.betas = betas
+
+    def __call__(self):
+        goals = list(self.rewardTables)
+        expectedReward = np.stack([self.model.expectedReward(self.rewardTables[goal]) for goal in goals])
+        values, maxActions, self.sweeps, self.Q = solveValueIteration(
+            self.model, expectedReward, self.convergenceTolerance, self.gamma, valueFloor=self.valueFloor,
+            maxIterations=self.maxIterations, telemetry=self.telemetry, returnQ=True)
+        self.boltzmannPolicies = boltzmannPolicies(self.Q, self.betas or ())
+
+        return {goal: self.model.solutionTables(values[g], maxActions[g], self.dtype) for g, goal in enumerate(goals)}
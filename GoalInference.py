@@ -0,0 +1,236 @@
+"""
+Goal inference from observed state sequences
+
+The observer's likelihood of a step s -> s' under goal g is
+    P(s'|s,g) = sum_a pi(a|s,g) P(s'|s,a)
+GoalInferenceStream precomputes it once per goal for every reachable (s, s')
+pair, then folds in one observed state at a time, updating the log-posterior
+over all goals in constant time per step for any number of tracked agents.
+
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from LogPolicy import logPolicyGivenGoal, logSumExp
+from SparseModel import sparseModel
+
+
+def logStateTransitionLikelihood(model, logPolicies):
+    """
+    log P(s'|s,g) for every (s, s') pair reachable in one step of a SparseModel,
+    as a log-sum-exp over the actions leading from s to s'. logPolicies is a
+    (G, S, A) array of log pi(a|s,g). Returns the sorted pair keys s*|S| + s'
+    and a (numPairs, G) log-likelihood table aligned with them.
+    """
+    numStates = len(model.states)
+    entryState, entryAction = model.entryStateAction()
+    pairKeys, pairOfEntry = np.unique(entryState * numStates + model.indices, return_inverse=True)
+
+    with np.errstate(divide='ignore'):
+        logWeights = (logPolicies[:, entryState, entryAction] + np.log(model.data)).T
+    maxWeight = np.full((len(pairKeys), len(logPolicies)), -np.inf)
+    np.maximum.at(maxWeight, pairOfEntry, logWeights)
+    maxWeight = np.where(np.isfinite(maxWeight), maxWeight, 0)
+    total = np.stack([np.bincount(pairOfEntry, np.exp(logWeights[:, g] - maxWeight[pairOfEntry, g]), minlength=len(pairKeys))
+                      for g in range(len(logPolicies))], axis=1)
+    with np.errstate(divide='ignore'):
+        return pairKeys, np.log(total) + maxWeight
+
+
+def goalLogPolicies(model, goalPolicies):
+    ## goal -> policy table (a dict or a CompactActionTable), or goal -> (S, A) array of log pi as returned by logPolicyGivenGoal
+    logPolicies = []
+    with np.errstate(divide='ignore'):
+        for goal, policy in goalPolicies.items():
+            logPolicies.append(np.log(model.policyArray(policy)) if isinstance(policy, Mapping) else np.asarray(policy, dtype=float))
+    return np.stack(logPolicies)
+
+
+def lookupStepLikelihood(pairKeys, logPairLikelihood, numStates, previousStates, currentStates):
+    """
+    log P(s_t|s_t-1,g) for arrays of state indices, shape (..., G). Steps that
+    no goal can produce (or with a missing state, index -1) contribute 0, i.e.
+    are treated as uninformative.
+    """
+    keys = previousStates * numStates + currentStates
+    position = np.minimum(np.searchsorted(pairKeys, keys), len(pairKeys) - 1)
+    stepLikelihood = logPairLikelihood[position]
+    found = (previousStates >= 0) & (currentStates >= 0) & (pairKeys[position] == keys) & np.isfinite(stepLikelihood).any(axis=-1)
+    return np.where(found[..., None], stepLikelihood, 0.)
+
+
+def logGoalPrior(goals, goalPrior=None):
+    if goalPrior is None:
+        return np.full(len(goals), -np.log(len(goals)))
+    with np.errstate(divide='ignore'):
+        return np.log(np.array([goalPrior[goal] for goal in goals], dtype=float))
+
+
+def trajectoryLogPosterior(transitionTable, trajectory, goalPolicies, goalPrior=None, model=None):
+    """
+    Log-posterior over goals after each step of a trajectory, shape (T-1, G),
+    accumulated as a running sum of log-likelihoods so it stays finite for
+    tracks of any length.
+    """
+    model = model if model is not None else sparseModel(transitionTable)
+    goals = list(goalPolicies)
+    pairKeys, logPairLikelihood = logStateTransitionLikelihood(model, goalLogPolicies(model, goalPolicies))
+    states = np.array([model.stateIndex[s] for s in trajectory], dtype=np.intp)
+
+    stepLikelihood = lookupStepLikelihood(pairKeys, logPairLikelihood, len(model.states), states[:-1], states[1:])
+    logPosterior = logGoalPrior(goals, goalPrior) + np.cumsum(stepLikelihood, axis=0)
+    return logPosterior - logSumExp(logPosterior, axis=-1, keepdims=True)
+
+
+class GoalInferenceStream(object):
+    """
+    Online goal posterior for numAgents tracks observed in lock step.
+    goalPolicies maps goal -> policy table pi(a|s,g), e.g. from PolicyGivenGoal,
+    or goal -> log pi array from logPolicyGivenGoal.
+    Steps that no goal can produce are treated as uninformative.
+    """
+    def __init__(self, transitionTable, goalPolicies, goalPrior=None, numAgents=1, model=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.goals = list(goalPolicies)
+        self.pairKeys, self.logPairLikelihood = logStateTransitionLikelihood(self.model, goalLogPolicies(self.model, goalPolicies))
+        self.logPrior = logGoalPrior(self.goals, goalPrior)
+        self.reset(numAgents)
+
+    def reset(self, numAgents=None):
+        if numAgents is not None:
+            self.numAgents = numAgents
+        self.logPosterior = np.tile(self.logPrior, (self.numAgents, 1))
+        self.currentState = np.full(self.numAgents, -1, dtype=np.intp)
+
+    def observe(self, states):
+        ## one observed state per agent
+        return self.observeIndices(np.array([self.model.stateIndex[s] for s in states], dtype=np.intp))
+
+    def observeIndices(self, stateIndices):
+        self.logPosterior += lookupStepLikelihood(self.pairKeys, self.logPairLikelihood, len(self.model.states),
+                                                  self.currentState, stateIndices)
+        self.logPosterior -= logSumExp(self.logPosterior, axis=1, keepdims=True)
+        self.currentState = np.asarray(stateIndices, dtype=np.intp)
+        return self.posterior
+
+    @property
+    def posterior(self):
+        return np.exp(self.logPosterior)
+
+    def posteriorTable(self, agent=0):
+        return dict(zip(self.goals, self.posterior[agent].tolist()))
+
+
+def stateIndexArray(model, trajectories, length=None):
+    """
+    Ragged trajectories (sequences of states, or of state indices) as an
+    (N, T) array of state indices padded with -1 after each track ends.
+    """
+    length = length if length is not None else max([len(trajectory) for trajectory in trajectories], default=0)
+    stateIndices = np.full((len(trajectories), length), -1, dtype=np.intp)
+    for n, trajectory in enumerate(trajectories):
+        if isinstance(trajectory, np.ndarray) and trajectory.dtype.kind in 'iu':
+            stateIndices[n, :len(trajectory)] = trajectory
+        else:
+            stateIndices[n, :len(trajectory)] = [model.stateIndex[s] for s in trajectory]
+    return stateIndices
+
+
+def saveTrajectories(path, model, trajectories):
+    ## padded state indices in .npy format, for TrajectoryScorer.scoreFile
+    np.save(path, stateIndexArray(model, trajectories).astype(np.int32))
+
+
+class TrajectoryScorer(object):
+    """
+    Goal posteriors for many trajectories at once. The pair tables of
+    logStateTransitionLikelihood are built once; every call then scores a
+    whole batch with one sorted lookup per step.
+    Trajectories are given as an (N, T) array of state indices padded with -1,
+    or as a ragged list of state sequences. Padded steps are uninformative, so
+    a finished track's curve stays at its final posterior.
+    """
+    def __init__(self, transitionTable, goalPolicies, goalPrior=None, model=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.goals = list(goalPolicies)
+        self.pairKeys, self.logPairLikelihood = logStateTransitionLikelihood(self.model, goalLogPolicies(self.model, goalPolicies))
+        self.logPrior = logGoalPrior(self.goals, goalPrior)
+
+    def logPosterior(self, trajectories):
+        ## (N, T-1, G) log-posterior over goals after each step of each trajectory
+        stateIndices = trajectories if isinstance(trajectories, np.ndarray) else stateIndexArray(self.model, trajectories)
+        stateIndices = np.asarray(stateIndices, dtype=np.intp)
+        stepLikelihood = lookupStepLikelihood(self.pairKeys, self.logPairLikelihood, len(self.model.states),
+                                              stateIndices[:, :-1], stateIndices[:, 1:])
+        logPosterior = self.logPrior + np.cumsum(stepLikelihood, axis=1)
+        return logPosterior - logSumExp(logPosterior, axis=-1, keepdims=True)
+
+    def posterior(self, trajectories):
+        return np.exp(self.logPosterior(trajectories))
+
+    def scoreFile(self, path, chunkSize=10000):
+        """
+        Streams an (N, T) .npy file of padded state indices (see
+        saveTrajectories) through logPosterior in chunks of chunkSize tracks,
+        reading it memory-mapped. Yields (first track, log-posterior chunk).
+        """
+        stateIndices = np.load(path, mmap_mode='r')
+        for start in range(0, len(stateIndices), chunkSize):
+            yield start, self.logPosterior(np.asarray(stateIndices[start:start + chunkSize]))
+
+
+def main():
+    import os
+    import tempfile
+    import time
+    from CompiledModel import MultiGoalValueIteration
+    from GridWorld import makeRewardTable, makeTransitionTable
+
+    convergenceThreshold = 10e-7
+    gamma = .9
+    beta = 2
+    trapStates = [(3,0), (3,1), (3,3)]
+    goalStates = {'A': (6,1), 'B': (6,4), 'C': (1,5)}
+
+    transition = makeTransitionTable(7, 6)
+    rewards = {goal: makeRewardTable(transition, goalState, trapStates) for goal, goalState in goalStates.items()}
+    model = sparseModel(transition)
+    solutions = MultiGoalValueIteration(transition, rewards, convergenceThreshold, gamma, model=model)()
+    goalPolicies = {goal: logPolicyGivenGoal(model, rewards[goal], solutions[goal][0], gamma, beta) for goal in rewards}
+
+    trajectoryToGoalA = [(0,0), (1,0), (1,1), (2,1), (2,2), (3,2), (4,2), (5,2), (5,1), (6,1)]
+    stream = GoalInferenceStream(transition, goalPolicies, model=model)
+    for s in trajectoryToGoalA:
+        stream.observe([s])
+        print(s, stream.posteriorTable())
+
+    ## the whole track at once; log posteriors stay finite however long the track is
+    longTrack = trajectoryToGoalA + [(6,1)] * 10000
+    logPosterior = trajectoryLogPosterior(transition, longTrack, goalPolicies, model=model)
+    print(len(longTrack), dict(zip(goalPolicies, logPosterior[-1].tolist())))
+
+    ## many tracks at once: prefixes of the three example trajectories, streamed from disk in chunks
+    trajectories = [trajectoryToGoalA, [(0,0), (0,1), (1,2), (1,3), (1,4), (1,5)], [(0,0), (1,1), (2,2), (2,3), (3,4), (4,4), (5,4), (6,4)]]
+    scorer = TrajectoryScorer(transition, goalPolicies, model=model)
+    batchLogPosterior = scorer.logPosterior(trajectories)
+    print('batch matches single-track scoring:', all(
+        np.allclose(batchLogPosterior[n, :len(trajectory) - 1], trajectoryLogPosterior(transition, trajectory, goalPolicies, model=model))
+        for n, trajectory in enumerate(trajectories)))
+
+    random = np.random.RandomState(0)
+    stateIndices = stateIndexArray(model, trajectories)
+    tracks = stateIndices[random.randint(len(trajectories), size=200000)]
+    tracks[np.arange(tracks.shape[1]) >= random.randint(2, tracks.shape[1] + 1, size=(len(tracks), 1))] = -1
+    path = os.path.join(tempfile.mkdtemp(prefix='tracks-'), 'tracks.npy')
+    np.save(path, tracks.astype(np.int32))
+    start = time.perf_counter()
+    finalPosterior = np.concatenate([np.exp(chunk[:, -1]) for first, chunk in scorer.scoreFile(path, chunkSize=50000)])
+    print('{} tracks scored in {:.3f}s, mean final posterior {}'.format(len(finalPosterior), time.perf_counter() - start,
+                                                                       finalPosterior.mean(axis=0).round(3).tolist()))
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Headless grid rendering for large value tables and policies
+
+Batch counterparts of visualizeValueTable and visualizePolicy that draw with
+one artist per layer instead of one per cell:
+    values       a single imshow of the value grid
+    goals/traps  a single RGBA imshow overlay
+    grid lines   a single LineCollection
+    policy       a single quiver with one arrow per (state, action), scaled by pi(a|s)
+Figures are built on the Agg canvas without pyplot, so nothing is shown and
+no display is needed; they are written straight to a file. The figure size
+is capped, cell labels are only drawn on small grids and grid lines on
+medium ones, and on large grids the policy is drawn for every stride-th cell
+in each direction so that the arrows stay legible and 500x500 grids render in
+well under a second.
+
+Value tables and policies are accepted as dictionaries, as the compact
+tables of CompactTables.py, or as arrays indexed like states (and actions),
+e.g. from a SparseModel or GridWorld.
+
+"""
+from collections.abc import Mapping
+import math
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from CompactTables import CompactActionTable, CompactValueTable
+from GridWorld import GridStates
+
+
+def newFigure(gridWidth, gridHeight, maxInches=12):
+    ## the 1.5 inches per cell of visualizeValueTable, capped at maxInches on the longer side
+    scale = min(1.5, float(maxInches) / max(gridWidth, gridHeight))
+    figure = Figure(figsize=(max(gridWidth * scale, 2), max(gridHeight * scale, 2)))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(1, 1, 1, frameon=False)
+    ax.set_xlim(-.5, gridWidth - .5)
+    ax.set_ylim(-.5, gridHeight - .5)
+    ax.set_aspect('equal')
+    if max(gridWidth, gridHeight) > 30:
+        ax.set_xticks([])
+        ax.set_yticks([])
+    else:
+        ax.set_xticks(range(gridWidth))
+        ax.set_yticks(range(gridHeight))
+    return figure, ax
+
+
+def stateCoordinates(states):
+    ## (x, y) integer arrays of the states, computed arithmetically for GridStates
+    if isinstance(states, GridStates):
+        return np.divmod(np.arange(len(states)), states.gridHeight)
+    return np.array(list(states), dtype=int).reshape(-1, 2).T
+
+
+def valueGrid(gridWidth, gridHeight, valueTable, states=None):
+    ## (gridHeight, gridWidth) image of the values, nan where a cell has no state
+    grid = np.full((gridHeight, gridWidth), np.nan)
+    if isinstance(valueTable, CompactValueTable):
+        states, values = valueTable.states, valueTable.array
+    elif isinstance(valueTable, Mapping):
+        states, values = list(valueTable), list(valueTable.values())
+    else:
+        values = np.asarray(valueTable)
+    x, y = stateCoordinates(states)
+    grid[y, x] = values
+    return grid
+
+
+def drawGridLines(ax, gridWidth, gridHeight, lineLimit=100):
+    if max(gridWidth, gridHeight) > lineLimit:
+        return
+    xs = np.arange(gridWidth + 1) - .5
+    ys = np.arange(gridHeight + 1) - .5
+    segments = [[(x, ys[0]), (x, ys[-1])] for x in xs] + [[(xs[0], y), (xs[-1], y)] for y in ys]
+    ax.add_collection(LineCollection(segments, colors='black', linewidths=.5 if max(gridWidth, gridHeight) > 30 else 1))
+
+
+def drawGoalsAndTraps(ax, gridWidth, gridHeight, goalStates=(), trapStates=(), trueGoalState=None):
+    ## goal cells green, the true goal darker, trap cells red, as one RGBA overlay
+    overlay = np.zeros((gridHeight, gridWidth, 4))
+    for cells, color in ((trapStates, (1, 0, 0, .1)), (goalStates, (0, .5, 0, .1)),
+                         ([trueGoalState] if trueGoalState else [], (0, .5, 0, .5))):
+        if len(cells):
+            x, y = np.array(list(cells), dtype=int).reshape(-1, 2).T
+            overlay[y, x] = color
+    ax.imshow(overlay, origin='lower', extent=(-.5, gridWidth - .5, -.5, gridHeight - .5), interpolation='nearest', zorder=2)
+
+
+def drawValueTable(ax, gridWidth, gridHeight, valueTable, states=None, goalStates=(), trapStates=(), labelLimit=400):
+    grid = valueGrid(gridWidth, gridHeight, valueTable, states)
+    image = ax.imshow(grid, origin='lower', extent=(-.5, gridWidth - .5, -.5, gridHeight - .5), interpolation='nearest',
+                      cmap='viridis', zorder=1)
+    drawGoalsAndTraps(ax, gridWidth, gridHeight, goalStates, trapStates)
+    drawGridLines(ax, gridWidth, gridHeight)
+    if gridWidth * gridHeight <= labelLimit:
+        for y, x in zip(*np.nonzero(~np.isnan(grid))):
+            ax.text(x - .2, y, str(round(grid[y, x], 3)), zorder=3)
+    return image
+
+
+def policyArrows(policy, states=None, actions=None, stride=1):
+    ## (x, y, dx * pi, dy * pi) of every action with nonzero probability, in cells whose x and y are multiples of stride
+    if isinstance(policy, CompactActionTable):
+        states, actions, policy = policy.states, policy.actions, policy.array
+    elif isinstance(policy, Mapping):
+        arrows = [(s[0], s[1], a[0] * p, a[1] * p) for s, actionDict in policy.items()
+                  if s[0] % stride == 0 and s[1] % stride == 0 for a, p in actionDict.items() if p]
+        return np.array(arrows, dtype=float).reshape(-1, 4).T
+    x, y = stateCoordinates(states)
+    shown = np.flatnonzero((x % stride == 0) & (y % stride == 0))
+    policy = np.asarray(policy)[shown]
+    stateIndex, actionIndex = np.nonzero(policy)
+    actionArray = np.array(list(actions), dtype=float).reshape(-1, 2)
+    probability = policy[stateIndex, actionIndex]
+    return (x[shown][stateIndex], y[shown][stateIndex],
+            actionArray[actionIndex, 0] * probability, actionArray[actionIndex, 1] * probability)
+
+
+def drawPolicy(ax, gridWidth, gridHeight, policy, states=None, actions=None, trueGoalState=None, otherGoals=(),
+               trapStates=(), arrowScale=.3, arrowLimit=60):
+    ## at most arrowLimit cells with arrows along each side; arrows are scaled up with the stride
+    stride = max(1, int(math.ceil(max(gridWidth, gridHeight) / float(arrowLimit))))
+    x, y, dx, dy = policyArrows(policy, states, actions, stride)
+    drawGoalsAndTraps(ax, gridWidth, gridHeight, otherGoals, trapStates, trueGoalState)
+    drawGridLines(ax, gridWidth, gridHeight)
+    return ax.quiver(x, y, dx * arrowScale * stride, dy * arrowScale * stride, angles='xy', scale_units='xy', scale=1,
+                     zorder=3, width=.15 / min(max(gridWidth, gridHeight, 10), arrowLimit))
+
+
+def saveValueTable(path, gridWidth, gridHeight, valueTable, states=None, goalStates=(), trapStates=(), title=None):
+    figure, ax = newFigure(gridWidth, gridHeight)
+    drawValueTable(ax, gridWidth, gridHeight, valueTable, states, goalStates, trapStates)
+    if title:
+        ax.set_title(title)
+    figure.savefig(path)
+
+
+def savePolicy(path, gridWidth, gridHeight, policy, states=None, actions=None, trueGoalState=None, otherGoals=(),
+               trapStates=(), title=None):
+    figure, ax = newFigure(gridWidth, gridHeight)
+    drawPolicy(ax, gridWidth, gridHeight, policy, states, actions, trueGoalState, otherGoals, trapStates)
+    if title:
+        ax.set_title(title)
+    figure.savefig(path)
+
+
+def savePolicies(path, gridWidth, gridHeight, policies, states=None, actions=None, trapStates=(), goalStates=None):
+    """
+    One page per policy in a multi-page PDF. policies maps title -> policy;
+    goalStates, if given, maps title -> that policy's goal state.
+    """
+    goalStates = goalStates or {}
+    with PdfPages(path) as pdf:
+        for title, policy in policies.items():
+            figure, ax = newFigure(gridWidth, gridHeight)
+            drawPolicy(ax, gridWidth, gridHeight, policy, states, actions, goalStates.get(title),
+                       [goal for goal in goalStates.values() if goal != goalStates.get(title)], trapStates)
+            ax.set_title(str(title))
+            pdf.savefig(figure)
+
+
+def main():
+    import os
+    import tempfile
+    import time
+    from CompiledModel import greedyPolicy, solveValueIteration
+    from GridWorld import GridWorld
+
+    outputDirectory = tempfile.mkdtemp(prefix='plots-')
+    for size in (10, 100, 500):
+        world = GridWorld(size, size, trapStates=[(size // 2, y) for y in range(size * 3 // 4)],
+                          goalStates={'A': (size - 1, 0), 'B': (size - 1, size - 1)}, noise=.1)
+        model = world.sparseModel()
+        expectedReward = np.stack([model.expectedReward(world.rewardData(model, goal)) for goal in world.goalStates])
+        values, maxActions, sweeps = solveValueIteration(model, expectedReward, 10e-4, .9)
+        policies = greedyPolicy(values, maxActions)
+
+        start = time.perf_counter()
+        saveValueTable(os.path.join(outputDirectory, 'values{}.png'.format(size)), size, size, values[0], model.states,
+                       list(world.goalStates.values()), world.trapStates)
+        savePolicies(os.path.join(outputDirectory, 'policies{}.pdf'.format(size)), size, size,
+                     dict(zip(world.goalStates, policies)), model.states, model.actions, world.trapStates, world.goalStates)
+        print('{}x{}: value image and {}-page policy pdf in {:.3f}s'.format(size, size, len(policies), time.perf_counter() - start))
+    print('written to', outputDirectory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Grid world generators
+
+Build transition and reward structures in the format used by the examples,
+    transitionTable[s][a][s'] = P(s'|s,a)
+    rewardTable[s][a][s'] = R(s,a,s')
+from a compact environment spec instead of writing them out as literals.
+GridWorld generates them on demand: lazily one state at a time through a
+read-only mapping, or straight into a SparseModel without building any
+dictionaries, so environments stay cheap to construct at 1000x1000.
+
+The reward of a transition (s, a, s') is, in order of precedence:
+    trapCost                   if s is a trap state
+    blockedCost                if blockedCost is set and a move left the agent in place
+    goalReward (+ step cost)   if s is the goal state; the step cost is only added with additiveGoalReward
+    step cost                  stayCost for (0, 0), minus the length of the move otherwise
+
+"""
+from collections.abc import Mapping, Sequence
+import math
+
+import numpy as np
+
+from SparseModel import SparseModel
+
+
+fourActions = ((1, 0), (0, 1), (-1, 0), (0, -1))
+fourActionsAndStay = fourActions + ((0, 0),)
+eightActions = ((1, 0), (0, 1), (-1, 0), (0, -1), (-1, 1), (1, -1), (1, 1), (-1, -1))
+
+
+def moveInGrid(gridWidth, gridHeight, s, action):
+    ## moving off the grid leaves the agent in place
+    snew = (s[0] + action[0], s[1] + action[1])
+    if 0 <= snew[0] < gridWidth and 0 <= snew[1] < gridHeight:
+        return snew
+    return s
+
+
+def transitionReward(s, action, snew, goalState, trapStates=(), goalReward=10, trapCost=-100, stayCost=-.1,
+                     blockedCost=None, additiveGoalReward=True):
+    if s in trapStates:
+        return trapCost
+    if blockedCost is not None and snew == s and action != (0, 0):
+        return blockedCost
+    stepCost = stayCost if action == (0, 0) else -math.hypot(*action)
+    if s == goalState:
+        return goalReward + stepCost if additiveGoalReward else goalReward
+    return stepCost
+
+
+def makeTransitionTable(gridWidth, gridHeight, allActions=fourActionsAndStay, noise=0.):
+    world = GridWorld(gridWidth, gridHeight, allActions, noise=noise)
+    return {s: world.transition(s) for s in world.states}
+
+
+def makeRewardTable(transitionTable, goalState, trapStates=(), **rewardSpec):
+    ## rewardSpec: goalReward, trapCost, stayCost, blockedCost, additiveGoalReward (see transitionReward)
+    return {s: {action: {snew: transitionReward(s, action, snew, goalState, trapStates, **rewardSpec) for snew in snewP}
+                for action, snewP in actionDict.items()}
+            for s, actionDict in transitionTable.items()}
+
+
+class GridStates(Sequence):
+    ## the states (x, y) of a grid in x-major order, without storing them
+    def __init__(self, gridWidth, gridHeight):
+        self.gridWidth = gridWidth
+        self.gridHeight = gridHeight
+
+    def __len__(self):
+        return self.gridWidth * self.gridHeight
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return (i // self.gridHeight, i % self.gridHeight)
+
+
+class GridStateIndex(Mapping):
+    ## inverse of GridStates, computed arithmetically
+    def __init__(self, gridWidth, gridHeight):
+        self.states = GridStates(gridWidth, gridHeight)
+
+    def __getitem__(self, s):
+        x, y = s
+        if not (0 <= x < self.states.gridWidth and 0 <= y < self.states.gridHeight):
+            raise KeyError(s)
+        return x * self.states.gridHeight + y
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __len__(self):
+        return len(self.states)
+
+
+class LazyTable(Mapping):
+    ## read-only state -> generator(state) mapping; entries are built on every access and never stored
+    def __init__(self, stateIndex, generator):
+        self.stateIndex = stateIndex
+        self.generator = generator
+
+    def __getitem__(self, s):
+        if s not in self.stateIndex:
+            raise KeyError(s)
+        return self.generator(s)
+
+    def __iter__(self):
+        return iter(self.stateIndex)
+
+    def __len__(self):
+        return len(self.stateIndex)
+
+
+class GridWorld(object):
+    def __init__(self, gridWidth, gridHeight, allActions=fourActionsAndStay, trapStates=(), goalStates=None, noise=0.,
+                 goalReward=10, trapCost=-100, stayCost=-.1, blockedCost=None, additiveGoalReward=True):
+        self.gridWidth = gridWidth
+        self.gridHeight = gridHeight
+        self.allActions = tuple(allActions)
+        self.trapStates = frozenset(trapStates)
+        self.goalStates = dict(goalStates or {})
+        self.noise = noise
+        self.rewardSpec = dict(goalReward=goalReward, trapCost=trapCost, stayCost=stayCost, blockedCost=blockedCost,
+                               additiveGoalReward=additiveGoalReward)
+        self.states = GridStates(gridWidth, gridHeight)
+        self.stateIndex = GridStateIndex(gridWidth, gridHeight)
+
+    def transition(self, s):
+        ## with noise > 0 the intended move succeeds with probability 1-noise, the rest is spread over the other moves
+        moves = [action for action in self.allActions if action != (0, 0)]
+        actionDict = {}
+        for action in self.allActions:
+            intended = moveInGrid(self.gridWidth, self.gridHeight, s, action)
+            if not self.noise or action == (0, 0):
+                actionDict[action] = {intended: 1.}
+                continue
+            snewP = {intended: 1. - self.noise}
+            others = [other for other in moves if other != action]
+            for other in others:
+                snew = moveInGrid(self.gridWidth, self.gridHeight, s, other)
+                snewP[snew] = snewP.get(snew, 0) + self.noise / len(others)
+            actionDict[action] = snewP
+        return actionDict
+
+    def reward(self, goal, s):
+        goalState = self.goalStates.get(goal, goal)
+        return {action: {snew: transitionReward(s, action, snew, goalState, self.trapStates, **self.rewardSpec) for snew in snewP}
+                for action, snewP in self.transition(s).items()}
+
+    @property
+    def transitionTable(self):
+        return LazyTable(self.stateIndex, self.transition)
+
+    def rewardTable(self, goal):
+        ## goal is a key of goalStates or a goal state itself
+        return LazyTable(self.stateIndex, lambda s: self.reward(goal, s))
+
+    def sparseModel(self):
+        ## the SparseModel of transitionTable, built with array operations only
+        numStates, numActions = len(self.states), len(self.allActions)
+        x, y = np.divmod(np.arange(numStates), self.gridHeight)
+        actions = np.array(self.allActions).reshape(numActions, 2)
+
+        def successor(dx, dy):
+            newX, newY = x[:, None] + dx, y[:, None] + dy
+            inside = (newX >= 0) & (newX < self.gridWidth) & (newY >= 0) & (newY < self.gridHeight)
+            return np.where(inside, newX * self.gridHeight + newY, np.arange(numStates)[:, None])
+
+        intended = successor(actions[:, 0], actions[:, 1])
+        rows = np.arange(numStates * numActions).reshape(numStates, numActions)
+        isMove = np.any(actions != 0, axis=1)
+        intendedP = np.where(isMove & (self.noise > 0), 1. - self.noise, 1.)
+        entryRow, entryState, entryP = [rows.ravel()], [intended.ravel()], [np.tile(intendedP, numStates)]
+
+        if self.noise:
+            moves = np.flatnonzero(isMove)
+            for j in moves:
+                others = moves[moves != j]
+                for k in others:
+                    entryRow.append(rows[:, j])
+                    entryState.append(intended[:, k])
+                    entryP.append(np.full(numStates, self.noise / len(others)))
+
+        ## merge repeated successors of the same row, as the dictionary form does
+        keys, entryOfKey = np.unique(np.concatenate(entryRow) * numStates + np.concatenate(entryState), return_inverse=True)
+        data = np.bincount(entryOfKey, np.concatenate(entryP))
+        rowOfKey, indices = np.divmod(keys, numStates)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rowOfKey, minlength=numStates * numActions))))
+
+        return SparseModel.fromArrays(self.states, self.stateIndex, list(self.allActions),
+                                      np.repeat(np.arange(numStates), numActions), np.tile(np.arange(numActions), numStates),
+                                      indptr, indices, data)
+
+    def rewardData(self, model, goal):
+        ## R(s,a,s') aligned with the entries of model (from sparseModel), built with array operations only
+        goalState = self.goalStates.get(goal, goal)
+        entryState, entryAction = model.entryStateAction()
+        actions = np.array(self.allActions).reshape(-1, 2)
+        isStay = np.all(actions == 0, axis=1)[entryAction]
+        stepCost = np.where(isStay, self.rewardSpec['stayCost'], -np.hypot(actions[entryAction, 0], actions[entryAction, 1]))
+
+        rewards = stepCost
+        isGoal = entryState == self.stateIndex[goalState]
+        goalReward = self.rewardSpec['goalReward'] + stepCost if self.rewardSpec['additiveGoalReward'] else self.rewardSpec['goalReward']
+        rewards = np.where(isGoal, goalReward, rewards)
+        if self.rewardSpec['blockedCost'] is not None:
+            rewards = np.where((model.indices == entryState) & ~isStay, self.rewardSpec['blockedCost'], rewards)
+        if self.trapStates:
+            isTrap = np.isin(entryState, [self.stateIndex[trap] for trap in self.trapStates])
+            rewards = np.where(isTrap, self.rewardSpec['trapCost'], rewards)
+        return rewards.astype(float)
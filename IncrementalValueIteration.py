@@ -0,0 +1,232 @@
+"""
+Incremental re-solve after local changes to the environment
+
+When a few cells of a solved map change (a door opens, a trap or a goal
+moves), the old values are still right almost everywhere. update() starts
+from them and re-propagates only through the region the change reaches:
+    1. the states whose rewards or transitions changed are backed up
+    2. a backup that moves V(s) by delta raises a bound on the Bellman error
+       of every predecessor p of s by gamma * max_a P(s|p,a) * delta
+    3. the states whose bound reaches convergenceTolerance form the next
+       frontier, which is backed up in one batched step; repeat until empty
+Q values and Boltzmann policies are then recomputed only for the states whose
+Q can have changed: the changed states and the predecessors of every state
+whose value moved. Values end within the same tolerance as a cold solve,
+and the cost follows the size of the affected region instead of the map.
+
+The goals of a map are solved together, as in MultiGoalValueIteration;
+calling the solver returns goal -> [valueTable, policyTable] with the
+Boltzmann policy pi(a|s,g) for beta, as PolicyGivenGoal computes it.
+
+"""
+import time
+
+import numpy as np
+
+from CompiledModel import greedyBackup, solveValueIteration
+from LogPolicy import boltzmannPolicy
+from PrioritizedSweeping import predecessorIndex, segmentEntries
+from SparseModel import sparseModel
+from Telemetry import checkIterationLimit
+
+
+class IncrementalValueIteration(object):
+    """
+    rewardTables maps goal -> rewardTable, or goal -> rewardData aligned with
+    the entries of model (e.g. from GridWorld.rewardData). Call once for the
+    cold solve, then update() after every change to the map.
+    """
+    def __init__(self, transitionTable, rewardTables, convergenceTolerance, gamma, beta, valueFloor=-1000, model=None,
+                 maxIterations=None, dtype=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.rewardTables = dict(rewardTables)
+        self.goals = list(self.rewardTables)
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.beta = beta
+        self.valueFloor = valueFloor
+        self.maxIterations = maxIterations
+        self.dtype = dtype
+        self.indexModel()
+
+    def indexModel(self):
+        ## the rows of every state and the predecessor graph, both as CSR arrays
+        model = self.model
+        self.stateRowOrder = np.argsort(model.rowState, kind='stable')
+        self.stateRowPtr = np.concatenate(([0], np.cumsum(np.bincount(model.rowState, minlength=len(model.states)))))
+        self.predecessorPtr, self.predecessors, self.predecessorP = predecessorIndex(model)
+
+    def stateRows(self, states):
+        ## CSR rows of the given state indices, with each row's position in states and the entries of all rows
+        rowEntries, rowCounts = segmentEntries(self.stateRowPtr, states)
+        rows = self.stateRowOrder[rowEntries]
+        entries, lengths = segmentEntries(self.model.indptr, rows)
+        return rows, np.repeat(np.arange(len(states)), rowCounts), entries, lengths
+
+    def rowTotals(self, entryValues, lengths):
+        ## sum (..., entries) per row, for rows of the given lengths
+        totals = np.zeros(entryValues.shape[:-1] + (len(lengths),))
+        nonEmpty = lengths > 0
+        if entryValues.shape[-1]:
+            starts = np.cumsum(lengths) - lengths
+            totals[..., nonEmpty] = np.add.reduceat(entryValues, starts[nonEmpty], axis=-1)
+        return totals
+
+    def expectedRewardOfStates(self, rewardTable, states):
+        ## rows of model.expectedReward(rewardTable) for the given states only
+        model = self.model
+        rows, position, entries, lengths = self.stateRows(states)
+        if isinstance(rewardTable, np.ndarray):
+            rewards = rewardTable[entries]
+        else:
+            entryRow = np.repeat(rows, lengths)
+            rewards = np.array([rewardTable[model.states[model.rowState[row]]][model.actions[model.rowAction[row]]][model.states[k]]
+                                for row, k in zip(entryRow, model.indices[entries])], dtype=float)
+        expectedReward = np.zeros((len(states), len(model.actions)))
+        expectedReward[position, model.rowAction[rows]] = self.rowTotals(model.data[entries] * rewards, lengths)
+        return expectedReward
+
+    def qValuesOfStates(self, states):
+        ## Q[..., states, :] of every goal from the current values, -inf for invalid actions
+        model = self.model
+        rows, position, entries, lengths = self.stateRows(states)
+        nextValue = self.rowTotals(model.data[entries] * self.values[:, model.indices[entries]], lengths)
+        Q = np.full((len(self.goals), len(states), len(model.actions)), -np.inf)
+        actions = model.rowAction[rows]
+        Q[:, position, actions] = self.expectedReward[:, states[position], actions] + self.gamma * nextValue
+        return Q
+
+    def __call__(self):
+        self.goals = list(self.rewardTables)
+        self.expectedReward = np.stack([self.model.expectedReward(self.rewardTables[goal]) for goal in self.goals])
+        self.values, maxActions, self.sweeps = solveValueIteration(self.model, self.expectedReward, self.convergenceTolerance,
+                                                                   self.gamma, valueFloor=self.valueFloor,
+                                                                   maxIterations=self.maxIterations)
+        self.Q = self.model.qValues(self.expectedReward, self.values, self.gamma)
+        self.policy = boltzmannPolicy(self.Q, self.beta)
+        return self.tables()
+
+    def update(self, rewardTables=None, model=None, changedStates=None):
+        """
+        Re-solve after a local change. rewardTables holds the new reward tables
+        of the goals whose rewards changed; model, if given, replaces the
+        transitions (it must have the same states and actions, and rewardData
+        arrays of every goal must then be given again, aligned with it).
+        changedStates lists the states whose rewards or transitions changed;
+        without it they are found from one full batched backup, which is
+        exact but costs as much as a single sweep.
+        """
+        start = time.perf_counter()
+        rewardTables = rewardTables or {}
+        self.rewardTables.update(rewardTables)
+        if model is not None:
+            self.model = model
+            self.indexModel()
+        goalsToUpdate = self.goals if model is not None else [goal for goal in self.goals if goal in rewardTables]
+
+        if changedStates is None:
+            for goal in goalsToUpdate:
+                self.expectedReward[self.goals.index(goal)] = self.model.expectedReward(self.rewardTables[goal])
+            Q = self.model.qValues(self.expectedReward, self.values, self.gamma)
+            changed = np.flatnonzero(np.any(Q != self.Q, axis=(0, 2)))
+        else:
+            changed = np.unique(np.array([self.model.stateIndex[s] for s in changedStates], dtype=np.intp))
+            for goal in goalsToUpdate:
+                self.expectedReward[self.goals.index(goal), changed] = self.expectedRewardOfStates(self.rewardTables[goal], changed)
+
+        valueMoved = self.propagate(changed)
+        affected = np.union1d(changed, self.predecessors[segmentEntries(self.predecessorPtr, valueMoved)[0]])
+        self.Q[:, affected] = self.qValuesOfStates(affected)
+        self.policy[:, affected] = boltzmannPolicy(self.Q[:, affected], self.beta)
+        self.affectedStates = len(affected)
+        self.updateTime = time.perf_counter() - start
+        return self.tables()
+
+    def propagate(self, frontier):
+        ## batched backups of successive frontiers; returns the states whose value moved
+        numStates = len(self.model.states)
+        errorBound = np.zeros(numStates)
+        moved = np.zeros(numStates, dtype=bool)
+        self.backups = self.rounds = 0
+        while len(frontier):
+            newValues, maxActions = greedyBackup(self.qValuesOfStates(frontier), self.valueFloor)
+            delta = np.max(np.abs(newValues - self.values[:, frontier]), axis=0)
+            self.values[:, frontier] = newValues
+            errorBound[frontier] = 0
+            self.backups += len(frontier)
+            self.rounds += 1
+            checkIterationLimit(self.rounds, delta.max(), self.maxIterations)
+
+            changedFrontier = delta > 0
+            moved[frontier[changedFrontier]] = True
+            entries, lengths = segmentEntries(self.predecessorPtr, frontier[changedFrontier])
+            predecessors = self.predecessors[entries]
+            np.add.at(errorBound, predecessors, self.gamma * self.predecessorP[entries] * np.repeat(delta[changedFrontier], lengths))
+            candidates = np.unique(predecessors)
+            frontier = candidates[errorBound[candidates] >= self.convergenceTolerance]
+        return np.flatnonzero(moved)
+
+    def tables(self):
+        model = self.model
+        if self.dtype is None:
+            return {goal: [model.valueTable(self.values[g]), model.actionTable(self.policy[g])] for g, goal in enumerate(self.goals)}
+        return {goal: [model.compactValueTable(self.values[g], self.dtype), model.compactActionTable(self.policy[g], self.dtype)]
+                for g, goal in enumerate(self.goals)}
+
+
+def main():
+    from GridWorld import GridWorld, eightActions, makeRewardTable, makeTransitionTable
+
+    ## the notebook's "Solid Barrier" environment, then the "Barrier with a Gap" at (3,1) as an update
+    gamma, beta, convergenceTolerance = .95, .4, 10e-7
+    transition = makeTransitionTable(gridWidth=7, gridHeight=6, allActions=eightActions)
+    rewardSpec = dict(blockedCost=-1, additiveGoalReward=False)
+    goalStates = {'A': (6, 4), 'B': (6, 1), 'C': (1, 5)}
+    barrierStates = [(3, 0), (3, 1), (3, 2), (3, 3)]
+    gapStates = [(3, 0), (3, 2), (3, 3)]
+
+    solver = IncrementalValueIteration(transition, {goal: makeRewardTable(transition, goalState, barrierStates, **rewardSpec)
+                                                    for goal, goalState in goalStates.items()},
+                                       convergenceTolerance, gamma, beta, valueFloor=0)
+    solver()
+    gapRewards = {goal: makeRewardTable(transition, goalState, gapStates, **rewardSpec) for goal, goalState in goalStates.items()}
+    gapTables = solver.update(gapRewards, changedStates=[(3, 1)])
+    coldTables = IncrementalValueIteration(transition, gapRewards, convergenceTolerance, gamma, beta, valueFloor=0)()
+    print('barrier -> gap: {} backups in {} rounds, {:.4f}s'.format(solver.backups, solver.rounds, solver.updateTime))
+    print('  pi(.|(2,1),A) after update: {}'.format({a: round(p, 3) for a, p in gapTables['A'][1][(2, 1)].items()}))
+    print('  max differences from a cold solve: value {:.2e}, policy {:.2e}'.format(
+        max(abs(gapTables[g][0][s] - coldTables[g][0][s]) for g in goalStates for s in transition),
+        max(abs(gapTables[g][1][s][a] - coldTables[g][1][s][a]) for g in goalStates for s in transition for a in transition[s])))
+
+    ## a 200x200 map with compact tables: open a door in a wall of traps, then move a goal
+    size = 200
+    wall = [(size // 2, y) for y in range(size * 3 // 4)]
+    door = wall[size // 3:size // 3 + 3]
+    world = GridWorld(size, size, trapStates=wall, goalStates={'A': (size - 1, 0), 'B': (size - 1, size - 1)}, noise=.1)
+    model = world.sparseModel()
+    start = time.perf_counter()
+    solver = IncrementalValueIteration(None, {goal: world.rewardData(model, goal) for goal in world.goalStates},
+                                       convergenceTolerance, gamma, beta, model=model, dtype=np.float32)
+    solver()
+    print('{}x{} cold solve of {} goals: {} sweeps, {:.2f}s'.format(size, size, len(solver.goals), solver.sweeps,
+                                                                     time.perf_counter() - start))
+
+    for change, newWorld, changedStates in (
+            ('open a door', GridWorld(size, size, trapStates=set(wall) - set(door), goalStates=world.goalStates, noise=.1), door),
+            ('move goal B', GridWorld(size, size, trapStates=set(wall) - set(door), noise=.1,
+                                      goalStates={'A': (size - 1, 0), 'B': (size - 1, size - 5)}),
+             [(size - 1, size - 1), (size - 1, size - 5)])):
+        goals = list(newWorld.goalStates) if change == 'open a door' else ['B']
+        solver.update({goal: newWorld.rewardData(model, goal) for goal in goals}, changedStates=changedStates)
+        start = time.perf_counter()
+        cold = IncrementalValueIteration(None, {goal: newWorld.rewardData(model, goal) for goal in newWorld.goalStates},
+                                         convergenceTolerance, gamma, beta, model=model)
+        cold()
+        coldTime = time.perf_counter() - start
+        print('{}: {} backups ({:.1f} sweeps) over {} affected states, {:.3f}s vs {:.2f}s cold; max value difference {:.2e}'.format(
+            change, solver.backups, solver.backups / float(len(model.states)), solver.affectedStates, solver.updateTime,
+            coldTime, np.max(np.abs(solver.values - cold.values))))
+
+
+if __name__ == '__main__':
+    main()
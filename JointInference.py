@@ -0,0 +1,163 @@
+"""
+Joint goal x environment inference from observed state sequences
+
+Instead of inferring the goal separately under each environment hypothesis
+(e.g. the notebook's solid barrier vs. barrier with a gap), every track is
+scored against all (goal, environment) pairs at once:
+    log P(s_1..s_t | g, e) = sum_k log P(s_k | s_k-1, g, e)
+The per-pair tables log P(s'|s,g,e) of logStateTransitionLikelihood are
+built once, for all environments that share a model in one batched call, and
+merged into a single (pairs, G, E) table, so scoring is one sorted lookup per
+step for the whole batch of tracks. The likelihoods then go through
+getMarginalPosteriors, which returns P(goal | data) and P(environment | data)
+after every step.
+
+"""
+import numpy as np
+
+from BayesianInference import getMarginalPosteriors
+from GoalInference import goalLogPolicies, logGoalPrior, logStateTransitionLikelihood, lookupStepLikelihood, stateIndexArray
+from SparseModel import sparseModel
+
+
+class GoalEnvironmentScorer(object):
+    """
+    environmentPolicies maps environment -> {goal: policy}, with the same
+    goals in every environment and policies as accepted by TrajectoryScorer
+    (policy tables or (S, A) arrays of log pi). Environments whose transitions
+    differ get their own model in environmentModels (same states); the rest
+    use model. dtype=np.float32 halves the size of the cached table.
+    """
+    def __init__(self, transitionTable, environmentPolicies, goalPrior=None, environmentPrior=None, model=None,
+                 environmentModels=None, dtype=np.float64):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.environments = list(environmentPolicies)
+        self.goals = list(environmentPolicies[self.environments[0]])
+        self.goalPrior = np.exp(logGoalPrior(self.goals, goalPrior))
+        self.environmentPrior = np.exp(logGoalPrior(self.environments, environmentPrior))
+        self.pairKeys, self.logPairLikelihood = self.pairTable(environmentPolicies, environmentModels or {}, dtype)
+
+    def pairTable(self, environmentPolicies, environmentModels, dtype):
+        ## one logStateTransitionLikelihood call per distinct model, merged on the union of the (s, s') pairs
+        groups = {}
+        for e, environment in enumerate(self.environments):
+            model = environmentModels.get(environment, self.model)
+            groups.setdefault(id(model), (model, []))[1].append(e)
+
+        tables = []
+        for model, environmentIndices in groups.values():
+            logPolicies = np.concatenate([goalLogPolicies(model, {goal: environmentPolicies[self.environments[e]][goal]
+                                                                   for goal in self.goals}) for e in environmentIndices])
+            pairKeys, logPairLikelihood = logStateTransitionLikelihood(model, logPolicies)
+            tables.append((pairKeys, logPairLikelihood.reshape(len(pairKeys), len(environmentIndices), len(self.goals)),
+                           environmentIndices))
+
+        allKeys = np.unique(np.concatenate([pairKeys for pairKeys, table, environmentIndices in tables]))
+        logPairLikelihood = np.full((len(allKeys), len(self.goals), len(self.environments)), -np.inf, dtype=dtype)
+        for pairKeys, table, environmentIndices in tables:
+            logPairLikelihood[np.ix_(np.searchsorted(allKeys, pairKeys), np.arange(len(self.goals)), environmentIndices)] = \
+                table.transpose(0, 2, 1)
+        return allKeys, logPairLikelihood
+
+    def logLikelihood(self, trajectories):
+        ## (N, T-1, G, E) log P(s_1..s_t | g, e) after each step, for padded state indices or a ragged list of tracks
+        stateIndices = trajectories if isinstance(trajectories, np.ndarray) else stateIndexArray(self.model, trajectories)
+        stateIndices = np.asarray(stateIndices, dtype=np.intp)
+        stepLikelihood = lookupStepLikelihood(self.pairKeys, self.logPairLikelihood.reshape(len(self.pairKeys), -1),
+                                              len(self.model.states), stateIndices[:, :-1], stateIndices[:, 1:])
+        return np.cumsum(stepLikelihood, axis=1).reshape(stepLikelihood.shape[:-1] + self.logPairLikelihood.shape[1:])
+
+    def marginals(self, trajectories, chunkSize=1000):
+        """
+        Goal and environment posteriors after each step, shapes (N, T-1, G)
+        and (N, T-1, E); nan for a track that no pair can produce. The joint
+        (N, T-1, G, E) likelihood is only formed for chunkSize tracks at a time.
+        """
+        stateIndices = trajectories if isinstance(trajectories, np.ndarray) else stateIndexArray(self.model, trajectories)
+        goalPosteriors, environmentPosteriors = [], []
+        for start in range(0, len(stateIndices), chunkSize):
+            logLikelihood = self.logLikelihood(stateIndices[start:start + chunkSize])
+            maxLog = logLikelihood.max(axis=(-2, -1), keepdims=True)
+            likelihood = np.exp(logLikelihood - np.where(np.isfinite(maxLog), maxLog, 0))
+            with np.errstate(invalid='ignore'):
+                goalPosterior, environmentPosterior = getMarginalPosteriors([self.goalPrior, self.environmentPrior], likelihood)
+            goalPosteriors.append(goalPosterior)
+            environmentPosteriors.append(environmentPosterior)
+        return np.concatenate(goalPosteriors), np.concatenate(environmentPosteriors)
+
+    def scoreFile(self, path, chunkSize=10000):
+        ## like TrajectoryScorer.scoreFile: yields (first track, goal marginals, environment marginals) per chunk
+        stateIndices = np.load(path, mmap_mode='r')
+        for start in range(0, len(stateIndices), chunkSize):
+            goalPosterior, environmentPosterior = self.marginals(np.asarray(stateIndices[start:start + chunkSize]))
+            yield start, goalPosterior, environmentPosterior
+
+
+def main():
+    import time
+    from CompiledModel import MultiGoalValueIteration
+    from GridWorld import GridWorld, eightActions, makeRewardTable, makeTransitionTable
+    from LogPolicy import logBoltzmannPolicy
+    from TrajectorySimulator import TrajectorySimulator
+
+    ## the notebook: goals A, B, C under the solid barrier and the barrier with a gap
+    gamma, beta, convergenceTolerance = .95, .4, 10e-7
+    transition = makeTransitionTable(gridWidth=7, gridHeight=6, allActions=eightActions)
+    model = sparseModel(transition)
+    rewardSpec = dict(blockedCost=-1, additiveGoalReward=False)
+    goalStates = {'A': (6,4), 'B': (6,1), 'C': (1,5)}
+    barriers = {'barrier': [(3,0), (3,1), (3,2), (3,3)], 'gap': [(3,0), (3,2), (3,3)]}
+    environmentPolicies = {}
+    for environment, barrierStates in barriers.items():
+        solver = MultiGoalValueIteration(transition, {goal: makeRewardTable(transition, goalState, barrierStates, **rewardSpec)
+                                                      for goal, goalState in goalStates.items()},
+                                         convergenceTolerance, gamma, valueFloor=0, model=model)
+        solver()
+        environmentPolicies[environment] = dict(zip(goalStates, logBoltzmannPolicy(solver.Q, beta)))
+
+    scorer = GoalEnvironmentScorer(transition, environmentPolicies, model=model)
+    trajectoryToGoalA = [(0,0), (1,1), (1,2), (2,3), (3,4), (4,4), (5,4), (6,4)]
+    trajectoryToGoalB = [(0,0), (1,1), (2,2), (2,3), (3,4), (4,3), (5,2), (6,1)]
+    trajectoryToGoalC = [(0,0), (0,1), (1,2), (1,3), (1,4), (1,5)]
+    goalPosterior, environmentPosterior = scorer.marginals([trajectoryToGoalA, trajectoryToGoalB, trajectoryToGoalC])
+    for name, n in (('A', 0), ('B', 1)):
+        print('trajectory to goal {}:'.format(name))
+        for t in range(goalPosterior.shape[1]):
+            print('  step {}: goals {} environments {}'.format(t + 1, goalPosterior[n, t].round(3).tolist(),
+                                                               environmentPosterior[n, t].round(3).tolist()))
+
+    ## 20 goals x 50 random map variants on a 15x15 grid, 10000 simulated tracks of 20 steps
+    size, numGoals, numMaps, numTracks = 15, 20, 50, 10000
+    random = np.random.RandomState(0)
+    world = GridWorld(size, size, noise=.1)
+    model = world.sparseModel()
+    cells = random.permutation(size * size)
+    goalStates = {g: world.states[i] for g, i in enumerate(cells[:numGoals])}
+    start = time.perf_counter()
+    environmentPolicies = {}
+    for m in range(numMaps):
+        mapWorld = GridWorld(size, size, trapStates=[world.states[i] for i in random.choice(cells[numGoals:], 15, replace=False)],
+                             goalStates=goalStates, noise=.1)
+        solver = MultiGoalValueIteration(None, {goal: mapWorld.rewardData(model, goal) for goal in goalStates},
+                                         convergenceTolerance, gamma, model=model)
+        solver()
+        environmentPolicies[m] = dict(zip(goalStates, logBoltzmannPolicy(solver.Q, beta)))
+    solveTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scorer = GoalEnvironmentScorer(None, environmentPolicies, model=model, dtype=np.float32)
+    tableTime = time.perf_counter() - start
+    trueGoal, trueMap = 3, 7
+    tracks = TrajectorySimulator(None, np.exp(environmentPolicies[trueMap][trueGoal]), [goalStates[trueGoal]],
+                                 model=model).sample(numTracks, 21, random=random)
+    start = time.perf_counter()
+    goalPosterior, environmentPosterior = scorer.marginals(tracks)
+    scoreTime = time.perf_counter() - start
+    print('{} goals x {} maps: policies in {:.2f}s, pair table {} in {:.2f}s, {} tracks scored in {:.2f}s'.format(
+        numGoals, numMaps, solveTime, scorer.logPairLikelihood.shape, tableTime, numTracks, scoreTime))
+    print('  mean final P(true goal) {:.3f}, P(true map) {:.3f}'.format(
+        np.nanmean(goalPosterior[:, -1, trueGoal]), np.nanmean(environmentPosterior[:, -1, trueMap])))
+
+
+if __name__ == '__main__':
+    main()
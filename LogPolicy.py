@@ -0,0 +1,40 @@
+"""
+Log-domain Boltzmann policies
+
+    log pi(a|s,g) = beta*Q(s,a) - log sum_a' exp(beta*Q(s,a'))
+
+computed for all states at once with a log-sum-exp over the action axis,
+so neither large Q values nor long products of probabilities overflow or
+underflow. Invalid actions carry Q = -inf and get log pi = -inf.
+
+"""
+import numpy as np
+
+
+def logSumExp(x, axis=-1, keepdims=False):
+    maxX = np.max(x, axis=axis, keepdims=True)
+    maxX = np.where(np.isfinite(maxX), maxX, 0)
+    with np.errstate(divide='ignore'):
+        result = np.log(np.sum(np.exp(x - maxX), axis=axis, keepdims=True)) + maxX
+    return result if keepdims else np.squeeze(result, axis=axis)
+
+
+def logBoltzmannPolicy(Q, beta):
+    ## Q of shape (..., S, A) -> log pi of the same shape
+    scaled = beta * np.asarray(Q, dtype=float)
+    return scaled - logSumExp(scaled, axis=-1, keepdims=True)
+
+
+def boltzmannPolicy(Q, beta):
+    return np.exp(logBoltzmannPolicy(Q, beta))
+
+
+def boltzmannPolicies(Q, betas):
+    ## {beta: pi} for each beta, sharing one Q
+    return {beta: boltzmannPolicy(Q, beta) for beta in betas}
+
+
+def logPolicyGivenGoal(model, rewardTable, valueTable, gamma, beta):
+    ## log pi(a|s,g) as an (S, A) array on a compiled model
+    Q = model.qValues(model.expectedReward(rewardTable), model.valueArray(valueTable), gamma)
+    return logBoltzmannPolicy(Q, beta)
@@ -0,0 +1,300 @@
+"""
+Multiprocess value iteration on a sparse model
+
+The states are split into contiguous blocks that are dealt out to worker
+processes. The model arrays, the expected rewards and the value vector live
+in shared memory, so every worker reads the same values without copies, and
+the workers step through the sweeps in lock step, one sweep at a time:
+    'jacobi'        every block reads the values of the previous sweep and
+                    writes into a second buffer; the buffers swap after each
+                    sweep, so the result is exactly that of solveValueIteration
+    'gauss-seidel'  every block reads and writes the one shared vector, so it
+                    may see blocks other workers have already updated in this
+                    sweep; which ones depends on timing, so the sweep count is
+                    not deterministic, and each block is still backed up as a
+                    whole. It is no faster to converge: on the benchmark grids
+                    it takes the same or a few more sweeps than 'jacobi'
+Both modes stop once a sweep changes no value by more than
+convergenceTolerance, and both return the values and tied-action mask of a
+final greedy backup in the parent, like solveValueIteration.
+
+The parent starts every sweep over one pipe per worker and waits on the
+pipes and the worker processes together. A worker that raises or is killed,
+or a sweep that outlasts sweepTimeout, makes the parent stop the others,
+unlink the shared memory and raise RuntimeError instead of waiting forever.
+
+"""
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing import shared_memory
+import os
+import time
+
+import numpy as np
+
+from CompiledModel import greedyBackup, solveValueIteration
+from SparseModel import sparseModel
+from Telemetry import checkIterationLimit
+
+
+def sharedArray(array):
+    ## a shared-memory copy of array and the spec a worker needs to attach to it
+    array = np.ascontiguousarray(array)
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+    shared[...] = array
+    return memory, shared, (memory.name, array.shape, array.dtype.str)
+
+
+def attachArray(spec):
+    name, shape, dtype = spec
+    try:
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        ## before Python 3.13 attaching registers the block again, with the resource tracker the workers share with
+        ## the parent; that is a no-op there, and the parent's unlink unregisters it
+        memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype, buffer=memory.buf)
+
+
+def stateBlocks(numStates, numBlocks):
+    ## [start, stop) bounds of numBlocks contiguous, nearly equal blocks of states
+    bounds = np.linspace(0, numStates, numBlocks + 1).astype(np.intp)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class BlockBackup(object):
+    ## the CSR rows of the states [start, stop), for backing up that block alone
+    def __init__(self, arrays, start, stop, numActions):
+        rowState, rowAction, indptr = arrays['rowState'], arrays['rowAction'], arrays['indptr']
+        rows = np.flatnonzero((rowState >= start) & (rowState < stop))
+        lengths = indptr[rows + 1] - indptr[rows]
+        entries = np.repeat(indptr[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        self.start, self.stop = start, stop
+        self.rowState, self.rowAction = rowState[rows] - start, rowAction[rows]
+        self.rowStarts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.intp)
+        self.nonEmpty = lengths > 0
+        self.indices = arrays['indices'][entries]
+        self.data = arrays['data'][entries]
+        self.expectedReward = np.array(arrays['expectedReward'][start:stop])
+        self.shape = (stop - start, numActions)
+
+    def __call__(self, values, gamma, valueFloor):
+        rowTotals = np.zeros(len(self.rowState))
+        if len(self.data):
+            rowTotals[self.nonEmpty] = np.add.reduceat(self.data * values[self.indices], self.rowStarts[self.nonEmpty])
+        Q = np.full(self.shape, -np.inf)
+        Q[self.rowState, self.rowAction] = self.expectedReward[self.rowState, self.rowAction] + gamma * rowTotals
+        newValues, maxActions = greedyBackup(Q, valueFloor)
+        return newValues
+
+
+def sweepWorker(specs, blocks, connection, gamma, valueFloor, mode):
+    ## one worker: for every message (the value buffer to read) back up its blocks and reply with the largest change;
+    ## None stops it
+    memories, arrays, backups = [], {}, []
+    values = source = target = None
+    try:
+        for name, spec in specs.items():
+            memory, arrays[name] = attachArray(spec)
+            memories.append(memory)
+        values = arrays['values']
+        backups = [BlockBackup(arrays, start, stop, arrays['expectedReward'].shape[1]) for start, stop in blocks]
+
+        while True:
+            current = connection.recv()
+            if current is None:
+                break
+            source = values[current]
+            target = values[1 - current] if mode == 'jacobi' else source
+            delta = 0.
+            for backup in backups:
+                newValues = backup(source, gamma, valueFloor)
+                if len(newValues):
+                    delta = max(delta, np.max(np.abs(newValues - source[backup.start:backup.stop])))
+                target[backup.start:backup.stop] = newValues
+            connection.send(delta)
+    finally:
+        del values, arrays, backups, source, target
+        for memory in memories:
+            memory.close()
+
+
+def workerFailure(worker):
+    worker.join()
+    return RuntimeError('sweep worker {} exited with code {}'.format(worker.name, worker.exitcode))
+
+
+def runSweep(connections, workers, current, timeout=None):
+    ## start one sweep on every worker and return the largest change; waits on the pipes and the processes together,
+    ## so a worker that raises or is killed, or a sweep that outlasts timeout seconds, raises RuntimeError
+    for connection in connections:
+        connection.send(current)
+    pending = dict(zip(connections, workers))
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delta = 0.
+    while pending:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        ready = multiprocessing.connection.wait(list(pending) + [worker.sentinel for worker in pending.values()], remaining)
+        if not ready:
+            raise RuntimeError('a sweep took longer than {} seconds'.format(timeout))
+        for connection in [connection for connection in pending if connection in ready]:
+            try:
+                delta = max(delta, connection.recv())
+            except EOFError:
+                raise workerFailure(pending[connection]) from None
+            del pending[connection]
+        for worker in pending.values():
+            if worker.sentinel in ready:
+                raise workerFailure(worker)
+    return delta
+
+
+def stopWorkers(connections, workers, timeout=5):
+    ## ask the live workers to stop, then reap them; a worker still busy after timeout seconds is killed
+    for connection, worker in zip(connections, workers):
+        if worker.is_alive():
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+    for worker in workers:
+        worker.join(timeout)
+        if worker.is_alive():
+            worker.kill()
+            worker.join()
+    for connection in connections:
+        connection.close()
+
+
+def solveParallelValueIteration(model, expectedReward, convergenceTolerance, gamma, values=None, valueFloor=-1000,
+                                processes=None, mode='jacobi', blocksPerProcess=1, maxIterations=None, sweepTimeout=None):
+    """
+    Value iteration for one expectedReward of shape (S, A) on a SparseModel,
+    split over processes worker processes (default: one per core). Returns
+    the values, the tied-action mask and the number of sweeps. Raises
+    RuntimeError if a worker fails or a sweep takes longer than sweepTimeout
+    seconds.
+    """
+    if mode not in ('jacobi', 'gauss-seidel'):
+        raise ValueError(mode)
+    expectedReward = np.asarray(expectedReward, dtype=float)
+    if expectedReward.shape != model.shape:
+        raise ValueError('expectedReward of shape {} is not one (S, A) = {} table; solve a stack of goals with '
+                         'solveValueIteration or one goal at a time'.format(expectedReward.shape, model.shape))
+    numStates = len(model.states)
+    processes = processes or os.cpu_count() or 1
+    blocks = stateBlocks(numStates, processes * blocksPerProcess)
+    workerBlocks = [blocks[w::processes] for w in range(processes) if blocks[w::processes]]
+
+    initialValues = np.zeros(numStates) if values is None else np.asarray(values, dtype=float)
+    sources = {'rowState': model.rowState, 'rowAction': model.rowAction, 'indptr': model.indptr,
+               'indices': model.indices, 'data': model.data, 'expectedReward': expectedReward,
+               'values': np.stack([initialValues, initialValues])}
+    memories, arrays, specs = [], {}, {}
+    sharedValues = None
+    try:
+        for name, array in sources.items():
+            memory, arrays[name], specs[name] = sharedArray(array)
+            memories.append(memory)
+        sharedValues = arrays['values']
+
+        connections, workers = [], []
+        try:
+            for blocks in workerBlocks:
+                connection, workerConnection = multiprocessing.Pipe()
+                worker = multiprocessing.Process(target=sweepWorker, args=(specs, blocks, workerConnection, gamma, valueFloor, mode))
+                worker.start()
+                workerConnection.close()
+                connections.append(connection)
+                workers.append(worker)
+
+            ## in Jacobi mode the sweeps alternate between the two value buffers, Gauss-Seidel stays on the first
+            sweeps, current = 0, 0
+            while True:
+                delta = runSweep(connections, workers, current, sweepTimeout)
+                sweeps += 1
+                if mode == 'jacobi':
+                    current = 1 - current
+                if delta < convergenceTolerance:
+                    break
+                checkIterationLimit(sweeps, delta, maxIterations)
+        finally:
+            stopWorkers(connections, workers)
+
+        ## the final backup in the parent: in Jacobi mode it repeats the last sweep, so the result matches solveValueIteration
+        previousValues = np.array(sharedValues[1 - current] if mode == 'jacobi' else sharedValues[current])
+        values, maxActions = greedyBackup(model.qValues(expectedReward, previousValues, gamma), valueFloor)
+    finally:
+        ## the views must go before the blocks can be closed
+        arrays.clear()
+        sharedValues = None
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+    return values, maxActions, sweeps
+
+
+class ParallelValueIteration(object):
+    """
+    Same interface as SparseValueIteration, run by solveParallelValueIteration.
+    """
+    def __init__(self, transitionTable, rewardTable, convergenceTolerance, gamma, valueTable=None, valueFloor=-1000,
+                 model=None, processes=None, mode='jacobi', blocksPerProcess=1, maxIterations=None, dtype=None,
+                 sweepTimeout=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.rewardTable = rewardTable
+        self.valueTable = valueTable
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.valueFloor = valueFloor
+        self.processes = processes
+        self.mode = mode
+        self.blocksPerProcess = blocksPerProcess
+        self.maxIterations = maxIterations
+        self.dtype = dtype
+        self.sweepTimeout = sweepTimeout
+
+    def __call__(self):
+        expectedReward = self.model.expectedReward(self.rewardTable)
+        values = self.model.valueArray(self.valueTable) if self.valueTable is not None else None
+        values, maxActions, self.sweeps = solveParallelValueIteration(
+            self.model, expectedReward, self.convergenceTolerance, self.gamma, values, self.valueFloor, self.processes,
+            self.mode, self.blocksPerProcess, self.maxIterations, self.sweepTimeout)
+
+        return self.model.solutionTables(values, maxActions, self.dtype)
+
+
+def benchmarkScaling(gridSize=300, processCounts=None, gamma=.95, convergenceTolerance=10e-7, noise=.1):
+    ## wall time and speedup over the serial solver for 1..N worker processes in both modes
+    from GridWorld import GridWorld
+
+    world = GridWorld(gridSize, gridSize, trapStates=[(gridSize // 2, y) for y in range(gridSize * 3 // 4)],
+                      goalStates={'A': (gridSize - 1, 0)}, noise=noise)
+    model = world.sparseModel()
+    expectedReward = model.expectedReward(world.rewardData(model, 'A'))
+    cores = os.cpu_count() or 1
+    processCounts = processCounts or sorted({1, 2, 4, 8, 16, 32, 64, cores} & set(range(1, max(cores, 2) + 1)))
+
+    start = time.perf_counter()
+    serialValues, serialMaxActions, serialSweeps = solveValueIteration(model, expectedReward, convergenceTolerance, gamma)
+    serialTime = time.perf_counter() - start
+    print('{} states, {} cores; serial: {} sweeps, {:.2f}s'.format(len(model.states), cores, serialSweeps, serialTime))
+    print('{:>14} {:>10} {:>8} {:>10} {:>9} {:>12}'.format('mode', 'processes', 'sweeps', 'seconds', 'speedup', 'max error'))
+    for mode in ('jacobi', 'gauss-seidel'):
+        for processes in processCounts:
+            start = time.perf_counter()
+            values, maxActions, sweeps = solveParallelValueIteration(model, expectedReward, convergenceTolerance, gamma,
+                                                                     processes=processes, mode=mode)
+            seconds = time.perf_counter() - start
+            print('{:>14} {:>10} {:>8} {:>10.2f} {:>9.2f} {:>12.2e}'.format(
+                mode, processes, sweeps, seconds, serialTime / seconds, np.max(np.abs(values - serialValues))))
+
+
+def main():
+    benchmarkScaling(gridSize=200, processCounts=[1, 2, 4])
+
+
+if __name__ == '__main__':
+    main()
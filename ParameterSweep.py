@@ -0,0 +1,119 @@
+"""
+Parameter sweeps for signaling policies
+
+For every (alpha, beta, gamma) on a grid: solve the goal policies, build the
+signaling rewards with observerInfoReward and solve the signaling policies.
+Work is split into one task per (gamma, beta) on a process pool. Inside a
+task the alphas are solved in increasing order, and each value iteration is
+warm-started from the converged values of the neighbouring alphas (linearly
+extrapolated from the last two, starting from the alpha = 0 goal values)
+instead of from all zeros. Duplicate alphas, betas and gammas are solved
+once, and every solve is capped at maxIterations sweeps.
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import time
+
+import numpy as np
+
+from CompiledModel import greedyPolicy, solveValueIteration
+from GetLikelihoodReward import observerInfoReward
+from LogPolicy import boltzmannPolicy
+from SparseModel import sparseModel
+
+
+def warmStartValues(solved, alpha):
+    ## values grow roughly linearly in alpha: extrapolate from the two nearest solved alphas, or start from the
+    ## nearest one when they coincide (alpha = 0 is solved twice) or the extrapolation is not finite
+    previousAlpha, previousValues = solved[-1]
+    if len(solved) < 2 or solved[-2][0] == previousAlpha:
+        return previousValues
+    olderAlpha, olderValues = solved[-2]
+    values = previousValues + (alpha - previousAlpha) / (previousAlpha - olderAlpha) * (previousValues - olderValues)
+    return values if np.all(np.isfinite(values)) else previousValues
+
+
+def solveSignalingTask(task):
+    ## one (gamma, beta) pair over all alphas; returns the rows of the results table
+    model, goals, rewards, goalValues, alphas, beta, gamma, convergenceTolerance, valueFloor, warmStart, maxIterations = task
+    expectedRewards = np.stack([model.expectedReward(r) for r in rewards])
+    policies = boltzmannPolicy(model.qValues(expectedRewards, goalValues, gamma), beta)
+    infoReward = observerInfoReward(model, policies)
+
+    rows = []
+    solved = [(0., goalValues)]
+    for alpha in sorted(set(alphas)):
+        newRewards = rewards + alpha * infoReward
+        expectedNewRewards = np.stack([model.expectedReward(r) for r in newRewards])
+        values, maxActions, sweeps = solveValueIteration(model, expectedNewRewards, convergenceTolerance, gamma,
+                                                         warmStartValues(solved, alpha) if warmStart else None, valueFloor,
+                                                         maxIterations)
+        solved.append((alpha, values))
+        policy = greedyPolicy(values, maxActions)
+        for g, goal in enumerate(goals):
+            rows.append({'alpha': alpha, 'beta': beta, 'gamma': gamma, 'goal': goal, 'sweeps': sweeps,
+                         'values': values[g], 'policy': policy[g]})
+    return rows
+
+
+def sweepSignalingPolicies(transitionTable, rewardTables, alphas, betas, gammas, convergenceTolerance,
+                           valueFloor=-1000, warmStart=True, processes=None, model=None, maxIterations=10000):
+    """
+    rewardTables maps goal -> original reward table. Returns the sparse model
+    and a list of rows {alpha, beta, gamma, goal, sweeps, values, policy}, where
+    values and policy are arrays indexed like model.states and model.actions
+    (model.valueTable and model.actionTable convert them back to dictionaries).
+    A solve still short of convergenceTolerance after maxIterations sweeps
+    raises IterationLimitExceeded.
+    """
+    model = model if model is not None else sparseModel(transitionTable)
+    goals = list(rewardTables)
+    rewards = np.stack([model.rewardData(rewardTables[goal]) for goal in goals])
+    expectedRewards = np.stack([model.expectedReward(r) for r in rewards])
+
+    ## goal policies depend only on gamma; solve them in increasing gamma, each warm-started from the last
+    goalValues = {}
+    values = None
+    gammas, betas = sorted(set(gammas)), sorted(set(betas))
+    for gamma in gammas:
+        values, maxActions, sweeps = solveValueIteration(model, expectedRewards, convergenceTolerance, gamma,
+                                                         values if warmStart else None, valueFloor, maxIterations)
+        goalValues[gamma] = values
+
+    tasks = [(model, goals, rewards, goalValues[gamma], alphas, beta, gamma, convergenceTolerance, valueFloor, warmStart,
+              maxIterations) for gamma, beta in itertools.product(gammas, betas)]
+    if processes == 1:
+        results = map(solveSignalingTask, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(solveSignalingTask, tasks))
+
+    return model, [row for rows in results for row in rows]
+
+
+def main():
+    from GridWorld import makeRewardTable, makeTransitionTable
+
+    convergenceThreshold = 10e-7
+    trapStates = [(3,0), (3,1), (3,3)]
+    goalStates = {'A': (6,1), 'B': (6,4), 'C': (1,5)}
+    transition = makeTransitionTable(7, 6)
+    rewards = {goal: makeRewardTable(transition, goalState, trapStates) for goal, goalState in goalStates.items()}
+
+    alphas = [1, 2, 3, 4, 5, 6, 7, 8]
+    betas = [1, 2, 4]
+    gammas = [.85, .9, .95]
+    for warmStart in (False, True):
+        start = time.perf_counter()
+        model, rows = sweepSignalingPolicies(transition, rewards, alphas, betas, gammas, convergenceThreshold, warmStart=warmStart)
+        totalSweeps = sum(row['sweeps'] for row in rows if row['goal'] == 'A')
+        print('warmStart={}: {} settings, {} sweeps, {:.2f}s'.format(warmStart, len(rows) // len(rewards), totalSweeps,
+                                                                    time.perf_counter() - start))
+
+    row = rows[0]
+    print(row['alpha'], row['beta'], row['gamma'], row['goal'], model.valueTable(row['values'])[(0,0)])
+
+
+if __name__ == '__main__':
+    main()
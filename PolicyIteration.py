@@ -0,0 +1,174 @@
+"""
+Policy iteration and modified policy iteration
+
+Both solvers take the same inputs as ValueIteration and return the same
+[valueTable, policyTable] dictionaries:
+    policy iteration            evaluate the current greedy policy exactly with
+                                one sparse linear solve of (I - gamma P_pi) V = R_pi,
+                                then improve it; stops when the policy is stable
+    modified policy iteration   evaluate with evaluationSweeps backups of the fixed
+                                policy instead; stops when a greedy backup changes
+                                no value by more than convergenceTolerance
+
+valueFloor acts as an extra action worth valueFloor with no continuation,
+which is how the maxVal start of the action search in ValueIteration behaves:
+a state whose best rounded Q does not beat the rounded floor takes the floor
+value. The returned policy comes from a final greedyBackup of the converged
+values, so ties are handled exactly as in ValueIteration (uniform over every
+action within rounding of the maximum, {} where the value is 0).
+
+"""
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix, identity
+    from scipy.sparse.linalg import spsolve
+except ImportError:
+    csr_matrix = None
+
+from CompiledModel import greedyBackup
+from SparseModel import sparseModel
+
+
+def improvePolicy(Q, valueFloor, actions=None):
+    """
+    Greedy action of every state, -1 where the floor wins. The current action
+    is kept while it is as good as the best one, so tied policies cannot cycle.
+    """
+    bestActions = np.argmax(Q, axis=-1)
+    bestQ = np.take_along_axis(Q, bestActions[:, None], axis=-1)[:, 0]
+    if actions is not None:
+        currentQ = np.take_along_axis(Q, np.maximum(actions, 0)[:, None], axis=-1)[:, 0]
+        keep = (actions >= 0) & (currentQ >= bestQ - 1e-12 * np.maximum(1., np.abs(bestQ)))
+        bestActions = np.where(keep, actions, bestActions)
+    useFloor = ~(np.round(bestQ, 3) > np.round(valueFloor, 3))
+    return np.where(useFloor, -1, bestActions)
+
+
+def policyTransitions(model, actions):
+    ## P_pi as an (S, S) matrix; rows of states on the floor are empty
+    numStates = len(model.states)
+    states = np.flatnonzero(actions >= 0)
+    if not hasattr(model, 'indptr'):
+        matrix = np.zeros((numStates, numStates))
+        matrix[states] = model.transitionMatrix[states, actions[states]]
+        return csr_matrix(matrix) if csr_matrix is not None else matrix
+
+    rowOf = np.full(model.shape, -1)
+    rowOf[model.rowState, model.rowAction] = np.arange(len(model.rowState))
+    rows = rowOf[states, actions[states]]
+    lengths = model.indptr[rows + 1] - model.indptr[rows]
+    entries = np.repeat(model.indptr[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    rowStates = np.repeat(states, lengths)
+    if csr_matrix is None:
+        matrix = np.zeros((numStates, numStates))
+        np.add.at(matrix, (rowStates, model.indices[entries]), model.data[entries])
+        return matrix
+    return csr_matrix((model.data[entries], (rowStates, model.indices[entries])), shape=(numStates, numStates))
+
+
+def policyRewards(expectedReward, actions, valueFloor):
+    ## R_pi, with the floor value for the states on the floor
+    return np.where(actions >= 0, np.take_along_axis(expectedReward, np.maximum(actions, 0)[:, None], axis=-1)[:, 0],
+                    valueFloor)
+
+
+def evaluatePolicy(model, expectedReward, actions, gamma, valueFloor):
+    ## exact V_pi from one linear solve
+    transitions = policyTransitions(model, actions)
+    rewards = policyRewards(expectedReward, actions, valueFloor)
+    if csr_matrix is None:
+        return np.linalg.solve(np.eye(len(rewards)) - gamma * transitions, rewards)
+    return spsolve((identity(len(rewards), format='csr') - gamma * transitions).tocsc(), rewards)
+
+
+def solvePolicyIteration(model, expectedReward, gamma, values=None, valueFloor=-1000):
+    """
+    Policy iteration for one expectedReward of shape (S, A). Returns the values,
+    the tied-action mask of their greedy backup and the number of improvements.
+    """
+    values = np.zeros(expectedReward.shape[:-1]) if values is None else np.asarray(values, dtype=float)
+    actions = improvePolicy(model.qValues(expectedReward, values, gamma), valueFloor)
+    iterations = 0
+    while True:
+        values = evaluatePolicy(model, expectedReward, actions, gamma, valueFloor)
+        newActions = improvePolicy(model.qValues(expectedReward, values, gamma), valueFloor, actions)
+        iterations += 1
+        if np.array_equal(newActions, actions):
+            break
+        actions = newActions
+
+    values, maxActions = greedyBackup(model.qValues(expectedReward, values, gamma), valueFloor)
+    return values, maxActions, iterations
+
+
+def solveModifiedPolicyIteration(model, expectedReward, convergenceTolerance, gamma, evaluationSweeps, values=None,
+                                 valueFloor=-1000):
+    """
+    Modified policy iteration: each greedy backup is followed by
+    evaluationSweeps backups of the resulting fixed policy. Like
+    solveValueIteration, expectedReward may carry leading batch axes.
+    Returns the values, the tied-action mask and the number of improvements.
+    """
+    if values is None:
+        values = np.zeros(expectedReward.shape[:-1])
+    values = np.broadcast_to(values, expectedReward.shape[:-1]).astype(float)
+
+    iterations = 0
+    while True:
+        Q = model.qValues(expectedReward, values, gamma)
+        newValues, maxActions = greedyBackup(Q, valueFloor)
+        delta = np.max(np.abs(newValues - values)) if newValues.size else 0.
+        values = newValues
+        iterations += 1
+        if delta < convergenceTolerance:
+            break
+
+        ## the floor is part of the policy: states on it keep the floor value
+        onFloor = ~(np.round(Q.max(axis=-1), 3) > np.round(valueFloor, 3))
+        actions = np.argmax(Q, axis=-1)
+        if values.ndim == 1:
+            ## a single policy: back up through P_pi alone instead of every action
+            actions = np.where(onFloor, -1, actions)
+            transitions = policyTransitions(model, actions)
+            rewards = policyRewards(expectedReward, actions, valueFloor)
+            for _ in range(evaluationSweeps):
+                values = rewards + gamma * (transitions @ values)
+            continue
+
+        rewards = np.take_along_axis(expectedReward, actions[..., None], axis=-1)[..., 0]
+        for _ in range(evaluationSweeps):
+            nextValues = np.take_along_axis(model.expectedNextValue(values), actions[..., None], axis=-1)[..., 0]
+            values = np.where(onFloor, valueFloor, rewards + gamma * nextValues)
+
+    return values, maxActions, iterations
+
+
+class PolicyIteration(object):
+    """
+    Same interface as ValueIteration. With evaluationSweeps=None each policy is
+    evaluated exactly (policy iteration); with evaluationSweeps=k it is
+    evaluated with k backups (modified policy iteration).
+    """
+    def __init__(self, transitionTable, rewardTable, convergenceTolerance, gamma, valueTable=None, valueFloor=-1000,
+                 model=None, evaluationSweeps=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.rewardTable = rewardTable
+        self.valueTable = valueTable
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.valueFloor = valueFloor
+        self.evaluationSweeps = evaluationSweeps
+
+    def __call__(self):
+        expectedReward = self.model.expectedReward(self.rewardTable)
+        values = self.model.valueArray(self.valueTable) if self.valueTable is not None else None
+        if self.evaluationSweeps is None:
+            values, maxActions, self.iterations = solvePolicyIteration(self.model, expectedReward, self.gamma, values,
+                                                                       self.valueFloor)
+        else:
+            values, maxActions, self.iterations = solveModifiedPolicyIteration(
+                self.model, expectedReward, self.convergenceTolerance, self.gamma, self.evaluationSweeps, values,
+                self.valueFloor)
+
+        return ([self.model.valueTable(values), self.model.policyTable(values, maxActions)])
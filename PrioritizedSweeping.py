@@ -0,0 +1,167 @@
+"""
+Prioritized sweeping: asynchronous value iteration ordered by Bellman error
+
+Instead of sweeping every state until the largest change falls below the
+tolerance, states are backed up in bands from a priority array keyed on
+their Bellman error: every state whose priority is within bandRatio of the
+current maximum is backed up in one batched step. After a backup of s
+changes V(s) by delta, every predecessor p of s (from a predecessor index
+built from the transitions) has its priority raised by
+gamma * max_a P(s|p,a) * delta. When no priority reaches the tolerance a
+full residual check re-seeds them with any state still off by more than the
+tolerance, so the result is converged to the same tolerance as
+ValueIteration.
+
+Without a valueTable the solve starts from V(s) = max_a R(s,a) / (1 - gamma),
+the value of collecting the best immediate reward forever. Away from the goal
+and trap states that is already a fixed point, so only their neighbourhood
+enters the queue and the values spread outwards from there, instead of every
+state starting off by its step cost as it does from zeros.
+
+Each solve records its progress in history, one row per |S| backups (the
+cost of one full sweep) plus a row per residual check:
+    {'backups', 'maxResidual', 'time'}
+
+"""
+import time
+
+import numpy as np
+
+from CompiledModel import greedyBackup
+from SparseModel import sparseModel
+
+
+def predecessorIndex(model):
+    """
+    For every state s', the states p with a transition into s' and the largest
+    probability max_a P(s'|p,a), as CSR arrays (predecessorPtr, predecessors,
+    predecessorP) indexed by s'.
+    """
+    numStates = len(model.states)
+    entryState, entryAction = model.entryStateAction()
+    keys, pairOfEntry = np.unique(model.indices * numStates + entryState, return_inverse=True)
+    predecessorP = np.zeros(len(keys))
+    np.maximum.at(predecessorP, pairOfEntry, model.data)
+    successors, predecessors = np.divmod(keys, numStates)
+    predecessorPtr = np.concatenate(([0], np.cumsum(np.bincount(successors, minlength=numStates))))
+    return predecessorPtr, predecessors, predecessorP
+
+
+def segmentEntries(ptr, segments):
+    ## positions of all entries of the given CSR segments, and each segment's length
+    lengths = ptr[segments + 1] - ptr[segments]
+    entries = np.repeat(ptr[segments] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return entries, lengths
+
+
+class PrioritizedValueIteration(object):
+    def __init__(self, transitionTable, rewardTable, convergenceTolerance, gamma, valueTable=None, valueFloor=-1000, model=None,
+                 bandRatio=.5):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        self.rewardTable = rewardTable
+        self.valueTable = valueTable
+        self.convergenceTolerance = convergenceTolerance
+        self.gamma = gamma
+        self.valueFloor = valueFloor
+        self.bandRatio = bandRatio
+
+        self.stateRowOrder = np.argsort(self.model.rowState, kind='stable')
+        self.stateRowPtr = np.concatenate(([0], np.cumsum(np.bincount(self.model.rowState, minlength=len(self.model.states)))))
+        self.predecessorPtr, self.predecessors, self.predecessorP = predecessorIndex(self.model)
+
+    def backupStates(self, states, values, expectedReward):
+        ## new V of the given states from their rows, with the value semantics of greedyBackup
+        model = self.model
+        rowEntries, rowCounts = segmentEntries(self.stateRowPtr, states)
+        rows = self.stateRowOrder[rowEntries]
+        entries, lengths = segmentEntries(model.indptr, rows)
+        nextValue = np.zeros(len(rows))
+        nonEmpty = lengths > 0
+        if len(entries):
+            nextValue[nonEmpty] = np.add.reduceat(model.data[entries] * values[model.indices[entries]],
+                                                  (np.cumsum(lengths) - lengths)[nonEmpty])
+        Q = np.full((len(states), len(model.actions)), -np.inf)
+        position = np.repeat(np.arange(len(states)), rowCounts)
+        actions = model.rowAction[rows]
+        Q[position, actions] = expectedReward[states[position], actions] + self.gamma * nextValue
+        return greedyBackup(Q, self.valueFloor)[0]
+
+    def __call__(self):
+        model = self.model
+        numStates = len(model.states)
+        expectedReward = model.expectedReward(self.rewardTable)
+        if self.valueTable is not None:
+            values = model.valueArray(self.valueTable)
+        else:
+            bestReward = np.where(model.validActions, expectedReward, -np.inf).max(axis=1)
+            values = np.maximum(bestReward / (1 - self.gamma), self.valueFloor)
+
+        self.history = []
+        self.backups = 0
+        start = time.perf_counter()
+        while True:
+            ## full residual check, counted as one sweep of backups
+            newValues, maxActions = greedyBackup(model.qValues(expectedReward, values, self.gamma), self.valueFloor)
+            residual = np.abs(newValues - values)
+            self.backups += numStates
+            self.history.append({'backups': self.backups, 'maxResidual': float(residual.max()), 'time': time.perf_counter() - start})
+            if residual.max() < self.convergenceTolerance:
+                break
+
+            ## priority bounds the Bellman error of each state; back up the top band until none reaches the tolerance
+            priority = np.where(residual >= self.convergenceTolerance, residual, 0.)
+            nextRecord = self.backups + numStates
+            while priority.max() >= self.convergenceTolerance:
+                band = np.flatnonzero(priority >= max(self.convergenceTolerance, self.bandRatio * priority.max()))
+                bandValues = self.backupStates(band, values, expectedReward)
+                delta = np.abs(bandValues - values[band])
+                values[band] = bandValues
+                priority[band] = 0.
+                self.backups += len(band)
+
+                moved = delta > 0
+                entries, lengths = segmentEntries(self.predecessorPtr, band[moved])
+                np.add.at(priority, self.predecessors[entries], self.gamma * self.predecessorP[entries] * np.repeat(delta[moved], lengths))
+
+                if self.backups >= nextRecord:
+                    self.history.append({'backups': self.backups, 'maxResidual': float(priority.max()),
+                                         'time': time.perf_counter() - start})
+                    nextRecord += numStates
+
+        self.valueTable = model.valueTable(newValues)
+        return ([self.valueTable, model.policyTable(newValues, maxActions)])
+
+
+def main():
+    from CompiledModel import solveValueIteration
+    from GridWorld import GridWorld
+
+    convergenceTolerance = 10e-7
+    gamma = .9
+    wall = [(30, y) for y in range(45)]
+    previousValues = None
+    for trapStates, warmStart in ((wall, False), (wall[:-5], True)):
+        ## the second solve opens a gap in the wall and starts from the values of the first
+        world = GridWorld(60, 60, trapStates=trapStates, goalStates={'A': (59, 0)}, noise=.1)
+        model = world.sparseModel()
+        rewardData = world.rewardData(model, 'A')
+        initialValues = previousValues if warmStart else None
+
+        start = time.perf_counter()
+        values, maxActions, sweeps = solveValueIteration(model, model.expectedReward(rewardData), convergenceTolerance, gamma,
+                                                         initialValues)
+        print('start from {}'.format('the previous solution' if warmStart else 'scratch'))
+        print('  full sweeps:  {:7d} backups, {:.3f}s'.format(sweeps * len(model.states), time.perf_counter() - start))
+
+        start = time.perf_counter()
+        performValueIteration = PrioritizedValueIteration(world.transitionTable, rewardData, convergenceTolerance, gamma,
+                                                          None if initialValues is None else model.valueTable(initialValues),
+                                                          model=model)
+        valueTable, policyTable = performValueIteration()
+        print('  prioritized:  {:7d} backups, {:.3f}s'.format(performValueIteration.backups, time.perf_counter() - start))
+        print('  max value difference: {:.2e}'.format(np.max(np.abs(model.valueArray(valueTable) - values))))
+        previousValues = values
+
+
+if __name__ == '__main__':
+    main()
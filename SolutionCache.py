@@ -0,0 +1,152 @@
+"""
+Persistent cache of solved models
+
+Solutions are keyed by a content hash of the model (its state labels,
+actions, transition arrays and valid actions), the expected rewards and the
+solver parameters, and stored as one directory of .npy files per key:
+    values.npy       V[s], the converged value table
+    Q.npy            Q[s,a], as computed by Qfunction from the converged values
+    policy.npy       pi[s,a], the Boltzmann policy for beta
+    maxActions.npy   the tied greedy actions, as used for policyTable
+Entries are loaded memory-mapped, so many worker processes share the pages
+read-only. Writes go to a temporary directory that is renamed into place,
+and the least recently used entries are evicted once the cache grows past
+maxBytes. An entry that cannot be read (truncated or corrupt files) is a
+miss: it is removed and solved again.
+
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from CompiledModel import solveValueIteration
+from GridWorld import GridStates
+from LogPolicy import boltzmannPolicy
+
+
+solutionFields = ('values', 'Q', 'policy', 'maxActions')
+
+
+def modelArrays(model):
+    ## the arrays that define a compiled or sparse model's transitions
+    if hasattr(model, 'indptr'):
+        return [model.rowState, model.rowAction, model.indptr, model.indices, model.data]
+    return [model.transitionMatrix]
+
+
+def stateKey(states):
+    ## the full state labels; GridStates are described by the grid size instead of listing every (x, y)
+    if isinstance(states, GridStates):
+        return ('grid', states.gridWidth, states.gridHeight)
+    return list(states)
+
+
+def hashModel(model, expectedReward, **parameters):
+    digest = hashlib.sha256()
+    digest.update(repr((stateKey(model.states), list(model.actions))).encode())
+    for array in modelArrays(model) + [model.validActions, np.asarray(expectedReward)]:
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.dtype.str, array.shape)).encode())
+        digest.update(array.data)
+    digest.update(repr(sorted(parameters.items())).encode())
+    return digest.hexdigest()
+
+
+class SolutionCache(object):
+    def __init__(self, cacheDirectory, maxBytes=1 << 30):
+        self.cacheDirectory = cacheDirectory
+        self.maxBytes = maxBytes
+        os.makedirs(cacheDirectory, exist_ok=True)
+
+    def entryPath(self, key):
+        return os.path.join(self.cacheDirectory, key)
+
+    def load(self, key):
+        ## memory-mapped arrays of a stored solution, or None; a missing, truncated or corrupt entry is a miss
+        path = self.entryPath(key)
+        try:
+            solution = {field: np.load(os.path.join(path, field + '.npy'), mmap_mode='r') for field in solutionFields}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            ## remove the damaged entry so that store() can replace it
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return solution
+
+    def store(self, key, solution):
+        path = self.entryPath(key)
+        temporaryPath = tempfile.mkdtemp(dir=self.cacheDirectory, prefix='.tmp-')
+        for field in solutionFields:
+            np.save(os.path.join(temporaryPath, field + '.npy'), np.asarray(solution[field]))
+        try:
+            os.rename(temporaryPath, path)
+        except OSError:
+            ## another process stored the same key first
+            shutil.rmtree(temporaryPath, ignore_errors=True)
+        self.evict()
+
+    def entries(self):
+        ## (last use, bytes, path) for every stored solution
+        entries = []
+        for name in os.listdir(self.cacheDirectory):
+            path = self.entryPath(name)
+            if name.startswith('.tmp-') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self.entries())
+        totalBytes = sum(size for lastUse, size, path in entries)
+        while entries and totalBytes > self.maxBytes:
+            lastUse, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            totalBytes -= size
+
+    def solve(self, model, expectedReward, convergenceTolerance, gamma, beta, valueFloor=-1000):
+        """
+        Cached solve of one reward (expectedReward of shape (S, A)): returns
+        {values, Q, policy, maxActions}, memory-mapped when read from disk.
+        """
+        key = hashModel(model, expectedReward, convergenceTolerance=convergenceTolerance, gamma=gamma, beta=beta,
+                        valueFloor=valueFloor)
+        solution = self.load(key)
+        if solution is not None:
+            return solution
+
+        values, maxActions, sweeps = solveValueIteration(model, expectedReward, convergenceTolerance, gamma,
+                                                         valueFloor=valueFloor)
+        Q = model.qValues(expectedReward, values, gamma)
+        solution = {'values': values, 'Q': Q, 'policy': boltzmannPolicy(Q, beta), 'maxActions': maxActions}
+        self.store(key, solution)
+        return solution
+
+
+def main():
+    from GridWorld import GridWorld
+
+    world = GridWorld(100, 100, trapStates=[(50, y) for y in range(80)], goalStates={'A': (99, 0)}, noise=.1)
+    model = world.sparseModel()
+    expectedReward = model.expectedReward(world.rewardData(model, 'A'))
+
+    cache = SolutionCache(tempfile.mkdtemp(prefix='solutions-'), maxBytes=64 << 20)
+    for attempt in ('cold', 'cached'):
+        start = time.perf_counter()
+        solution = cache.solve(model, expectedReward, 10e-7, .95, beta=2)
+        print('{}: {:.4f}s, V(0,0) = {:.4f}'.format(attempt, time.perf_counter() - start,
+                                                   solution['values'][model.stateIndex[(0, 0)]]))
+    shutil.rmtree(cache.cacheDirectory)
+
+
+if __name__ == '__main__':
+    main()
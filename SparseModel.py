@@ -0,0 +1,131 @@
+"""
+Sparse model: CSR form of the nested transition/reward dictionaries
+
+Grid transitions have only a handful of successors per (s,a), so instead of
+the dense |S|x|A|x|S| tensor of CompiledModel the transitions are stored as
+one CSR row per valid (state, action) pair. Memory grows with the number of
+nonzero transitions, and the model plugs into the same solvers
+(solveValueIteration, VectorizedValueIteration, compiledQfunction).
+
+"""
+import numpy as np
+
+from CompiledModel import CompiledModel, VectorizedValueIteration, compiledQfunction
+
+
+class SparseModel(CompiledModel):
+    def __init__(self, transitionTable):
+        self.indexModel(transitionTable)
+
+        rowState, rowAction, rowLength = [], [], []
+        indices, data = [], []
+        for s, actionDict in transitionTable.items():
+            i = self.stateIndex[s]
+            for action, snewP in actionDict.items():
+                rowState.append(i)
+                rowAction.append(self.actionIndex[action])
+                rowLength.append(len(snewP))
+                for snew, P in snewP.items():
+                    indices.append(self.stateIndex[snew])
+                    data.append(P)
+
+        self.rowState = np.array(rowState, dtype=np.intp)
+        self.rowAction = np.array(rowAction, dtype=np.intp)
+        self.indptr = np.concatenate(([0], np.cumsum(rowLength, dtype=np.intp)))
+        self.indices = np.array(indices, dtype=np.intp)
+        self.data = np.array(data, dtype=float)
+
+    @classmethod
+    def fromArrays(cls, states, stateIndex, actions, rowState, rowAction, indptr, indices, data):
+        ## build directly from CSR arrays; states and stateIndex may be any sequence and mapping
+        model = cls.__new__(cls)
+        model.states = states
+        model.stateIndex = stateIndex
+        model.actions = list(actions)
+        model.actionIndex = {action: j for j, action in enumerate(model.actions)}
+        model.rowState = np.asarray(rowState, dtype=np.intp)
+        model.rowAction = np.asarray(rowAction, dtype=np.intp)
+        model.indptr = np.asarray(indptr, dtype=np.intp)
+        model.indices = np.asarray(indices, dtype=np.intp)
+        model.data = np.asarray(data, dtype=float)
+        model.validActions = np.zeros((len(states), len(model.actions)), dtype=bool)
+        model.validActions[model.rowState, model.rowAction] = True
+        return model
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.rowState, self.rowAction, self.indptr, self.indices,
+                                              self.data, self.validActions))
+
+    def rowSum(self, entries):
+        ## sum the per-transition entries (..., nnz) of each (s,a) row into a dense (..., S, A) array
+        entries = np.asarray(entries)
+        rowTotals = np.zeros(entries.shape[:-1] + (len(self.rowState),))
+        nonEmpty = self.indptr[:-1] < self.indptr[1:]
+        if self.nnz:
+            rowTotals[..., nonEmpty] = np.add.reduceat(entries, self.indptr[:-1][nonEmpty], axis=-1)
+        result = np.zeros(entries.shape[:-1] + self.shape)
+        result[..., self.rowState, self.rowAction] = rowTotals
+        return result
+
+    def rewardMatrix(self, rewardTable):
+        ## dense R[s,a,s'] like CompiledModel.rewardMatrix, zero where the transition does not exist; S*A*S floats,
+        ## so only for grids small enough to hold the dense tensor (expectedReward does not need it)
+        rewards = rewardTable if isinstance(rewardTable, np.ndarray) else self.rewardData(rewardTable)
+        entryState, entryAction = self.entryStateAction()
+        R = np.zeros(self.shape + (len(self.states),))
+        R[entryState, entryAction, self.indices] = rewards
+        return R
+
+    def rewardData(self, rewardTable):
+        ## R(s,a,s') aligned with the CSR entries, walking rewardTable in entry order
+        rewards = np.empty(self.nnz)
+        for row in range(len(self.rowState)):
+            snewR = rewardTable[self.states[self.rowState[row]]][self.actions[self.rowAction[row]]]
+            start, end = self.indptr[row], self.indptr[row + 1]
+            rewards[start:end] = [snewR[self.states[k]] for k in self.indices[start:end]]
+        return rewards
+
+    def rewardTableFromData(self, rewards):
+        ## inverse of rewardData: nested {s: {a: {s': r}}} dictionary
+        rewardTable = {s: {} for s in self.states}
+        for row in range(len(self.rowState)):
+            start, end = self.indptr[row], self.indptr[row + 1]
+            rewardTable[self.states[self.rowState[row]]][self.actions[self.rowAction[row]]] = {
+                self.states[k]: float(r) for k, r in zip(self.indices[start:end], rewards[start:end])}
+        return rewardTable
+
+    def expectedReward(self, rewardTable):
+        ## R[s,a] = sum_s' P(s'|s,a) R(s,a,s'); rewardTable may also be given as rewardData
+        rewards = rewardTable if isinstance(rewardTable, np.ndarray) else self.rewardData(rewardTable)
+        return self.rowSum(self.data * rewards)
+
+    def entryStateAction(self):
+        ## (state, action) index of every CSR entry
+        entryRow = np.repeat(np.arange(len(self.rowState)), np.diff(self.indptr))
+        return self.rowState[entryRow], self.rowAction[entryRow]
+
+    def expectedNextValue(self, values):
+        ## sum_s' P(s'|s,a) V(s'), for values of shape (..., S) -> (..., S, A)
+        return self.rowSum(self.data * np.asarray(values)[..., self.indices])
+
+
+def sparseModel(transitionTable):
+    return SparseModel(transitionTable)
+
+
+class SparseValueIteration(VectorizedValueIteration):
+    def __init__(self, transitionTable, rewardTable, convergenceTolerance, gamma, valueTable=None, valueFloor=-1000, model=None,
+                 maxIterations=None, telemetry=None, dtype=None, betas=None):
+        model = model if model is not None else sparseModel(transitionTable)
+        super(SparseValueIteration, self).__init__(transitionTable, rewardTable, convergenceTolerance, gamma,
+                                                   valueTable, valueFloor, model, maxIterations, telemetry, dtype, betas)
+
+
+def sparseQfunction(transitionTable, rewardTable, valueTable, gamma=0.95, model=None, dtype=None):
+    model = model if model is not None else sparseModel(transitionTable)
+    return compiledQfunction(model, rewardTable, valueTable, gamma, dtype)
@@ -0,0 +1,59 @@
+"""
+Per-sweep telemetry for the value iteration solvers
+
+Pass a SweepTelemetry as telemetry= to ValueIteration, VectorizedValueIteration
+or solveValueIteration to record, after every sweep,
+    sweep            1-based sweep number
+    delta            largest value change in the sweep
+    seconds          wall time of the sweep
+    elapsed          wall time since the solve started
+    statesUpdated    number of states whose value changed
+    policyChanges    number of states whose set of maximizing actions changed
+Records are kept in history (unless keepHistory=False; each solve starts a new
+history) and passed to callback as they arrive, e.g. to push them to a dashboard; a callback may raise to
+abort the solve. The counters are only computed when telemetry is given, so
+solves without it pay nothing beyond one comparison per sweep.
+
+maxIterations caps the number of sweeps: a solve that has not converged by
+then raises IterationLimitExceeded instead of looping forever.
+
+"""
+import time
+
+
+class IterationLimitExceeded(RuntimeError):
+    def __init__(self, sweeps, delta):
+        super(IterationLimitExceeded, self).__init__(
+            'value iteration did not converge in {} sweeps (last delta {:.3g})'.format(sweeps, delta))
+        self.sweeps = sweeps
+        self.delta = delta
+
+
+def checkIterationLimit(sweeps, delta, maxIterations):
+    if maxIterations is not None and sweeps >= maxIterations:
+        raise IterationLimitExceeded(sweeps, delta)
+
+
+class SweepTelemetry(object):
+    def __init__(self, callback=None, keepHistory=True):
+        self.callback = callback
+        self.keepHistory = keepHistory
+        self.start()
+
+    def start(self):
+        ## called at the start of every solve, so a reused telemetry object only holds the latest run
+        self.sweeps = 0
+        self.history = []
+        self.startTime = self.lastTime = time.perf_counter()
+
+    def recordSweep(self, delta, statesUpdated, policyChanges):
+        now = time.perf_counter()
+        self.sweeps += 1
+        record = {'sweep': self.sweeps, 'delta': float(delta), 'seconds': now - self.lastTime,
+                  'elapsed': now - self.startTime, 'statesUpdated': int(statesUpdated), 'policyChanges': int(policyChanges)}
+        self.lastTime = now
+        if self.keepHistory:
+            self.history.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
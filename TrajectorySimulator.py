@@ -0,0 +1,150 @@
+"""
+Monte Carlo trajectories from a policy and a transition model
+
+All walkers advance together, one time step at a time. Both stages of a
+step are inverse-CDF lookups into arrays precomputed once:
+    action      actionCDF[s, a], the cumulative pi(a|s) of each state
+    successor   one sorted array holding, for CSR row r of a SparseModel,
+                r + the cumulative P(s'|s,a) of its entries, so the successor
+                of every walker is a single searchsorted of r + u
+and the uniforms for both come from one random draw of shape (walkers, 2)
+per step. Policies may be goal policies from PolicyGivenGoal or the solvers'
+boltzmannPolicies, or signaling policies solved from GetLikelihoodReward.
+
+Trajectories are (N, T) arrays of state indices, padded with -1 once a
+walker reaches a terminal state or a state whose policy is empty. This is
+the format of saveTrajectories and TrajectoryScorer.scoreFile; on disk it
+is stored as int16 when the states allow it, written chunk by chunk into a
+memory-mapped .npy file so that 10^6 tracks never sit in memory at once.
+
+"""
+import numpy as np
+
+from SparseModel import sparseModel
+
+
+def trajectoryDtype(numStates):
+    ## the smallest signed integer type holding every state index and the -1 padding
+    return np.int16 if numStates <= np.iinfo(np.int16).max else np.int32
+
+
+class TrajectorySimulator(object):
+    def __init__(self, transitionTable, policy, terminalStates=(), model=None):
+        self.model = model if model is not None else sparseModel(transitionTable)
+        model = self.model
+        pi = np.asarray(policy, dtype=float) if isinstance(policy, np.ndarray) else model.policyArray(policy)
+        pi = np.where(model.validActions, pi, 0.)
+
+        total = pi.sum(axis=1)
+        self.hasPolicy = total > 0
+        self.actionCDF = np.cumsum(pi, axis=1) / np.where(self.hasPolicy, total, 1)[:, None]
+        ## rounding can leave the cumulative sum short of 1; it is set to 1 from the last action with pi > 0 on, so that
+        ## every u in (0, 1] picks an action the state has and the policy takes
+        lastAction = pi.shape[1] - 1 - np.argmax(pi[:, ::-1] > 0, axis=1)
+        self.actionCDF[np.arange(pi.shape[1]) >= lastAction[:, None]] = 1.
+
+        self.rowOf = np.full(model.shape, -1, dtype=np.intp)
+        self.rowOf[model.rowState, model.rowAction] = np.arange(len(model.rowState))
+        entryRow = np.repeat(np.arange(len(model.rowState)), np.diff(model.indptr))
+        cumulative = np.cumsum(model.data)
+        rowStartTotal = np.concatenate(([0.], cumulative))[model.indptr[:-1]]
+        rowTotal = cumulative[np.maximum(model.indptr[1:] - 1, 0)] - rowStartTotal
+        self.successorCDF = entryRow + (cumulative - rowStartTotal[entryRow]) / rowTotal[entryRow]
+        self.successorCDF[model.indptr[1:][model.indptr[1:] > model.indptr[:-1]] - 1] = np.unique(entryRow) + 1.
+
+        self.isTerminal = np.zeros(len(model.states), dtype=bool)
+        self.isTerminal[[model.stateIndex[s] for s in terminalStates]] = True
+
+    def startIndices(self, numTrajectories, startStates, random):
+        ## one start state for all, a list to draw from, or uniform over the non-terminal states
+        if startStates is None:
+            return random.choice(np.flatnonzero(~self.isTerminal), size=numTrajectories)
+        if isinstance(startStates, tuple) and startStates in self.model.stateIndex:
+            return np.full(numTrajectories, self.model.stateIndex[startStates], dtype=np.intp)
+        candidates = np.array([self.model.stateIndex[s] for s in startStates], dtype=np.intp)
+        return candidates[random.randint(len(candidates), size=numTrajectories)]
+
+    def step(self, states, uniforms):
+        ## next state index of every walker, from uniforms of shape (walkers, 2) in (0, 1]
+        actions = np.minimum((self.actionCDF[states] < uniforms[:, :1]).sum(axis=1), self.actionCDF.shape[1] - 1)
+        rows = self.rowOf[states, actions]
+        return self.model.indices[np.searchsorted(self.successorCDF, rows + uniforms[:, 1])]
+
+    def sample(self, numTrajectories, length, startStates=None, random=None):
+        """
+        (numTrajectories, length) state indices; each track starts at
+        startStates (a state, or a list of states to draw from uniformly).
+        """
+        random = random if random is not None else np.random.RandomState()
+        trajectories = np.full((numTrajectories, length), -1, dtype=np.intp)
+        states = self.startIndices(numTrajectories, startStates, random)
+        alive = np.arange(numTrajectories)
+        for t in range(length):
+            trajectories[alive, t] = states
+            moving = ~self.isTerminal[states] & self.hasPolicy[states]
+            alive, states = alive[moving], states[moving]
+            if t == length - 1 or not len(alive):
+                break
+            states = self.step(states, 1. - random.random_sample((len(alive), 2)))
+        return trajectories
+
+    def simulateToFile(self, path, numTrajectories, length, startStates=None, seed=0, chunkSize=100000):
+        ## streams numTrajectories tracks to an (N, length) .npy file in chunks of chunkSize; returns the path
+        random = np.random.RandomState(seed)
+        trajectories = np.lib.format.open_memmap(path, mode='w+', dtype=trajectoryDtype(len(self.model.states)),
+                                                 shape=(numTrajectories, length))
+        for start in range(0, numTrajectories, chunkSize):
+            stop = min(start + chunkSize, numTrajectories)
+            trajectories[start:stop] = self.sample(stop - start, length, startStates, random)
+        trajectories.flush()
+        del trajectories
+        return path
+
+
+def main():
+    import os
+    import tempfile
+    import time
+    from CompiledModel import MultiGoalValueIteration
+    from GetLikelihoodReward import GetLikelihoodReward
+    from GoalInference import TrajectoryScorer
+    from GridWorld import makeRewardTable, makeTransitionTable
+
+    ## the signaling setup of GetLikelihoodReward: goal policies, then policies that also signal the true goal
+    convergenceThreshold, gamma, beta, alpha = 10e-7, .9, 2, 5
+    trapStates = [(3,0), (3,1), (3,3)]
+    goalStates = {'A': (6,1), 'B': (6,4), 'C': (1,5)}
+    transition = makeTransitionTable(7, 6, [(1,0), (0,1), (-1,0), (0,-1), (0,0)], noise=.1)
+    model = sparseModel(transition)
+    rewards = {goal: makeRewardTable(transition, goalState, trapStates) for goal, goalState in goalStates.items()}
+    goalSolver = MultiGoalValueIteration(transition, rewards, convergenceThreshold, gamma, model=model, betas=[beta])
+    goalSolver()
+    goalPolicies = {goal: goalSolver.boltzmannPolicies[beta][g] for g, goal in enumerate(rewards)}
+    signalingRewards = GetLikelihoodReward(transition, {goal: model.actionTable(pi) for goal, pi in goalPolicies.items()},
+                                           model=model).rewardsForAllGoals(rewards, alpha)
+    signalingSolver = MultiGoalValueIteration(transition, signalingRewards, convergenceThreshold, gamma, model=model, betas=[beta])
+    signalingSolver()
+    signalingPolicies = {goal: signalingSolver.boltzmannPolicies[beta][g] for g, goal in enumerate(rewards)}
+
+    ## 10^6 tracks per policy from (0,0), streamed to disk, then scored by an observer who knows the goal policies
+    with np.errstate(divide='ignore'):
+        scorer = TrajectoryScorer(transition, {goal: np.log(pi) for goal, pi in goalPolicies.items()}, model=model)
+    directory = tempfile.mkdtemp(prefix='simulated-')
+    numTrajectories, length = 1000000, 12
+    for name, policies in (('goal', goalPolicies), ('signaling', signalingPolicies)):
+        for g, goal in enumerate(['A', 'C']):
+            simulator = TrajectorySimulator(transition, policies[goal], terminalStates=[goalStates[goal]], model=model)
+            path = os.path.join(directory, '{}{}.npy'.format(name, goal))
+            start = time.perf_counter()
+            simulator.simulateToFile(path, numTrajectories, length, startStates=(0, 0), seed=g)
+            seconds = time.perf_counter() - start
+            trueGoal = scorer.goals.index(goal)
+            posteriorAtStep = np.concatenate([np.exp(chunk[:, [1, 3, 5], trueGoal]) for first, chunk in scorer.scoreFile(path, 200000)])
+            print('{:>9} policy, goal {}: {} tracks in {:.2f}s ({:.1f} MB); mean P(true goal) after 2/4/6 steps {}'.format(
+                name, goal, numTrajectories, seconds, os.path.getsize(path) / 1e6, posteriorAtStep.mean(axis=0).round(3).tolist()))
+            os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
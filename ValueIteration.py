@@ -5,29 +5,46 @@ Name:
 Date: April 2020
 
 """
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
 import numpy as np
 
+from CompiledModel import VectorizedValueIteration, tableArray
+from GridWorld import makeRewardTable, makeTransitionTable
+from LogPolicy import boltzmannPolicies
+from Telemetry import IterationLimitExceeded, SweepTelemetry, checkIterationLimit
+
 
 class ValueIteration(object):
-    def __init__(self, transitionTable, rewardTable, valueTable, convergenceTolerance, gamma):
+    def __init__(self, transitionTable, rewardTable, valueTable, convergenceTolerance, gamma, maxIterations=None, telemetry=None, betas=None):
         self.transitionTable = transitionTable
         self.rewardTable  = rewardTable
-        self.valueTable = valueTable
+        ## the sweep writes into valueTable, so read-only mappings such as a CompactValueTable are copied to a dict
+        self.valueTable = valueTable if isinstance(valueTable, dict) else dict(valueTable)
         self.convergenceTolerance = convergenceTolerance
         self.gamma = gamma
+        self.maxIterations = maxIterations
+        self.telemetry = telemetry
+        self.betas = betas
 
     def __call__(self):
         #######################################
         ########## YOUR CODE HERE #############
         #######################################
         policyTableTemp = dict.fromkeys(self.valueTable)
+        ## with betas, the Q values of the sweep are kept for the Q array and Boltzmann policies of the last one
+        QTableTemp = {s: {} for s in self.valueTable} if self.betas is not None else None
         
+        sweeps = 0
+        ## read once: without telemetry the state loop does no extra work
+        telemetryEnabled = self.telemetry is not None
+        if telemetryEnabled:
+            self.telemetry.start()
         while True:
             delta=0
+            statesUpdated = policyChanges = 0
             for s, oldvalue in self.valueTable.items():
                 v = oldvalue
+                if telemetryEnabled:
+                    oldPolicy = policyTableTemp[s]
                 
                 maxActionIdx=[]
                 maxVal=0
@@ -41,6 +58,8 @@ class ValueIteration(object):
                     for snew, P in self.transitionTable[s][action].items():
                         r= self.rewardTable[s][action][snew]
                         temp += P*(r + self.gamma * self.valueTable[snew])
+                    if QTableTemp is not None:
+                        QTableTemp[s][action] = temp
                     
                     #if s==(1,4):
                     #    print(action, temp, maxVal)
@@ -63,15 +82,25 @@ class ValueIteration(object):
                         policyTableTemp[s][maxActionIdx[i]]= 1./len(maxActionIdx)               
                 
                 delta=max(delta, abs(v- self.valueTable[s]))
+                if telemetryEnabled:
+                    statesUpdated += v != self.valueTable[s]
+                    policyChanges += oldPolicy != policyTableTemp[s]
                 
-                
+            sweeps += 1
+            if telemetryEnabled:
+                self.telemetry.recordSweep(delta, statesUpdated, policyChanges)
             if delta < self.convergenceTolerance:
                 break
+            checkIterationLimit(sweeps, delta, self.maxIterations)
             
             policyTable={k: v for k, v in policyTableTemp.items() if v is not None}
             
 
 
+        if QTableTemp is not None:
+            self.states, self.actions, self.Q = tableArray(QTableTemp)
+            self.boltzmannPolicies = boltzmannPolicies(self.Q, self.betas)
+
         return ([self.valueTable, policyTable])
 
 
@@ -84,6 +113,10 @@ def viewDictionaryStructure(d, levels, indent=0):
             print('\t' * (indent+1) + str(levels[indent+1])+ ": " + str(value))
 
 def visualizeValueTable(gridWidth, gridHeight,  valueTable, goalState=None, trapStates=None):
+    ## plotting is imported on first use, so the solvers load without matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Rectangle
+
     gridAdjust = .5
     gridScale = 1.5
 
@@ -114,6 +147,10 @@ def visualizeValueTable(gridWidth, gridHeight,  valueTable, goalState=None, trap
 
 
 def visualizePolicy(states, policy, trueGoalState=None, otherGoals=None, trapStates=None, arrowScale=.3):
+    ## plotting is imported on first use, so the solvers load without matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Rectangle
+
     # grid height/width
     gridAdjust = .5
     gridScale = 1.5
@@ -147,6 +184,14 @@ def visualizePolicy(states, policy, trueGoalState=None, otherGoals=None, trapSta
     plt.show()
     
 
+def checkParity(valueTable, policyTable, vectorizedValueTable, vectorizedPolicyTable, convergenceTolerance):
+    ## the vectorized solver sweeps synchronously, so values agree up to the convergence tolerance
+    maxValueError = max(abs(valueTable[s] - vectorizedValueTable[s]) for s in valueTable)
+    assert maxValueError < 100 * convergenceTolerance, maxValueError
+    assert policyTable == vectorizedPolicyTable
+    print('vectorized parity: max value error {:.2e}, policies identical'.format(maxValueError))
+
+
 def main():
 
     """
@@ -155,31 +200,50 @@ def main():
 
 	"""
 	    
-    transitionTableDet = {(0, 0): {(1, 0): {(1, 0): 1},(0, 1): {(0, 1): 1},(-1, 0): {(0, 0): 1},(0, -1): {(0, 0): 1}},(0, 1): {(1, 0): {(1, 1): 1},(0, 1): {(0, 2): 1},(-1, 0): {(0, 1): 1},(0, -1): {(0, 0): 1}},(0, 2): {(1, 0): {(1, 2): 1},(0, 1): {(0, 3): 1},(-1, 0): {(0, 2): 1},(0, -1): {(0, 1): 1}},(0, 3): {(1, 0): {(1, 3): 1},(0, 1): {(0, 4): 1},(-1, 0): {(0, 3): 1},(0, -1): {(0, 2): 1}},(0, 4): {(1, 0): {(1, 4): 1},(0, 1): {(0, 4): 1},(-1, 0): {(0, 4): 1},(0, -1): {(0, 3): 1}},(1, 0): {(1, 0): {(2, 0): 1},(0, 1): {(1, 1): 1},(-1, 0): {(0, 0): 1},(0, -1): {(1, 0): 1}},(1, 1): {(1, 0): {(2, 1): 1},(0, 1): {(1, 2): 1},(-1, 0): {(0, 1): 1},(0, -1): {(1, 0): 1}},(1, 2): {(1, 0): {(2, 2): 1},(0, 1): {(1, 3): 1},(-1, 0): {(0, 2): 1},(0, -1): {(1, 1): 1}},(1, 3): {(1, 0): {(2, 3): 1},(0, 1): {(1, 4): 1},(-1, 0): {(0, 3): 1},(0, -1): {(1, 2): 1}},(1, 4): {(1, 0): {(2, 4): 1},(0, 1): {(1, 4): 1},(-1, 0): {(0, 4): 1},(0, -1): {(1, 3): 1}},(2, 0): {(1, 0): {(2, 0): 1},(0, 1): {(2, 1): 1},(-1, 0): {(1, 0): 1},(0, -1): {(2, 0): 1}},(2, 1): {(1, 0): {(2, 1): 1},(0, 1): {(2, 2): 1},(-1, 0): {(1, 1): 1},(0, -1): {(2, 0): 1}},(2, 2): {(1, 0): {(2, 2): 1},(0, 1): {(2, 3): 1},(-1, 0): {(1, 2): 1},(0, -1): {(2, 1): 1}},(2, 3): {(1, 0): {(2, 3): 1},(0, 1): {(2, 4): 1},(-1, 0): {(1, 3): 1},(0, -1): {(2, 2): 1}},(2, 4): {(1, 0): {(2, 4): 1},(0, 1): {(2, 4): 1},(-1, 0): {(1, 4): 1},(0, -1): {(2, 3): 1}}}
-    rewardTableDet = {(0, 0): {(1, 0): {(1, 0): -1},(0, 1): {(0, 1): -1},(-1, 0): {(0, 0): -1},(0, -1): {(0, 0): -1}},(0, 1): {(1, 0): {(1, 1): -1},(0, 1): {(0, 2): -1},(-1, 0): {(0, 1): -1},(0, -1): {(0, 0): -1}},(0, 2): {(1, 0): {(1, 2): -1},(0, 1): {(0, 3): -1},(-1, 0): {(0, 2): -1},(0, -1): {(0, 1): -1}},(0, 3): {(1, 0): {(1, 3): -1},(0, 1): {(0, 4): -1},(-1, 0): {(0, 3): -1},(0, -1): {(0, 2): -1}},(0, 4): {(1, 0): {(1, 4): -1},(0, 1): {(0, 4): -1},(-1, 0): {(0, 4): -1},(0, -1): {(0, 3): -1}},(1, 0): {(1, 0): {(2, 0): -1},(0, 1): {(1, 1): -1},(-1, 0): {(0, 0): -1},(0, -1): {(1, 0): -1}},(1, 1): {(1, 0): {(2, 1): 10},(0, 1): {(1, 2): 10},(-1, 0): {(0, 1): 10},(0, -1): {(1, 0): 10}},(1, 2): {(1, 0): {(2, 2): -100},(0, 1): {(1, 3): -100},(-1, 0): {(0, 2): -100},(0, -1): {(1, 1): -100}},(1, 3): {(1, 0): {(2, 3): -1},(0, 1): {(1, 4): -1},(-1, 0): {(0, 3): -1},(0, -1): {(1, 2): -1}},(1, 4): {(1, 0): {(2, 4): -1},(0, 1): {(1, 4): -1},(-1, 0): {(0, 4): -1},(0, -1): {(1, 3): -1}},(2, 0): {(1, 0): {(2, 0): -1},(0, 1): {(2, 1): -1},(-1, 0): {(1, 0): -1},(0, -1): {(2, 0): -1}},(2, 1): {(1, 0): {(2, 1): -1},(0, 1): {(2, 2): -1},(-1, 0): {(1, 1): -1},(0, -1): {(2, 0): -1}},(2, 2): {(1, 0): {(2, 2): -1},(0, 1): {(2, 3): -1},(-1, 0): {(1, 2): -1},(0, -1): {(2, 1): -1}},(2, 3): {(1, 0): {(2, 3): -1},(0, 1): {(2, 4): -1},(-1, 0): {(1, 3): -1},(0, -1): {(2, 2): -1}},(2, 4): {(1, 0): {(2, 4): -1},(0, 1): {(2, 4): -1},(-1, 0): {(1, 4): -1},(0, -1): {(2, 3): -1}}}
-    valueTableDet = {(0, 0): 0,(0, 1): 0,(0, 2): 0,(0, 3): 0,(0, 4): 0,(1, 0): 0,(1, 1): 0,(1, 2): 0,(1, 3): 0,(1, 4): 0,(2, 0): 0,(2, 1): 0,(2, 2): 0,(2, 3): 0,(2, 4): 0}
+    transitionTableDet = makeTransitionTable(gridWidth=3, gridHeight=5, allActions=[(1,0), (0,1), (-1,0), (0,-1)])
+    rewardTableDet = makeRewardTable(transitionTableDet, goalState=(1,1), trapStates=[(1,2)], additiveGoalReward=False)
+    valueTableDet = dict.fromkeys(transitionTableDet, 0)
     convergenceTolerance = 10e-7
     gamma = .9
+    performVectorizedValueIteration = VectorizedValueIteration(transitionTableDet, rewardTableDet, convergenceTolerance, gamma, dict(valueTableDet), valueFloor=0)
+    vectorizedValuesDet, vectorizedPolicyDet = performVectorizedValueIteration()
     performValueIteration = ValueIteration(transitionTableDet, rewardTableDet, valueTableDet, convergenceTolerance, gamma)
     optimalValuesDet, policyTableDet = performValueIteration()
     print('optimalValuesDet: {}'.format(optimalValuesDet))
     print('policyTableDet: {}'.format(policyTableDet))
+    checkParity(optimalValuesDet, policyTableDet, vectorizedValuesDet, vectorizedPolicyDet, convergenceTolerance)
+
+    ## per-sweep telemetry, and a sweep cap that stops the solve instead of looping forever
+    telemetry = SweepTelemetry()
+    ValueIteration(transitionTableDet, rewardTableDet, dict.fromkeys(transitionTableDet, 0), convergenceTolerance, gamma, telemetry=telemetry)()
+    print('sweeps: {}, first: {}, last: {}'.format(telemetry.sweeps, telemetry.history[0], telemetry.history[-1]))
+    try:
+        ValueIteration(transitionTableDet, rewardTableDet, dict.fromkeys(transitionTableDet, 0), convergenceTolerance, gamma, maxIterations=3)()
+    except IterationLimitExceeded as error:
+        print(error)
+
+    ## the Q array and Boltzmann policies of the last sweep, without a separate Qfunction pass
+    performValueIteration = ValueIteration(transitionTableDet, rewardTableDet, dict.fromkeys(transitionTableDet, 0), convergenceTolerance, gamma, betas=[.5, 2])
+    performValueIteration()
+    for beta, policy in performValueIteration.boltzmannPolicies.items():
+        print('beta {}: pi(.|(0,0)) = {}'.format(beta, {a: round(float(p), 3) for a, p in zip(performValueIteration.actions, policy[0])}))
 
 
     """
 	Example 2: Probabilistic Transition
 
 	"""
-    transitionTableProb = {(0, 0): {(1, 0): {(1, 0): 0.7, (0, 1): 0.2, (0, 0): 0.1},(0, 1): {(0, 1): 0.7999999999999999, (1, 0): 0.2},(-1, 0): {(0, 0): 0.7, (1, 0): 0.2, (0, 1): 0.1},(0, -1): {(0, 0): 0.7, (1, 0): 0.1, (0, 1): 0.2}},(0, 1): {(1, 0): {(1, 1): 0.7999999999999999, (0, 1): 0.1, (0, 2): 0.1},(0, 1): {(0, 2): 0.7999999999999999, (0, 0): 0.2},(-1, 0): {(0, 1): 0.8999999999999999, (0, 0): 0.1},(0, -1): {(0, 0): 0.7999999999999999, (0, 2): 0.1, (0, 1): 0.1}},(0, 2): {(1, 0): {(1, 2): 0.7999999999999999, (0, 1): 0.2},(0, 1): {(0, 3): 0.7999999999999999, (0, 1): 0.1, (1, 2): 0.1},(-1, 0): {(0, 2): 0.7, (0, 1): 0.1, (1, 2): 0.1, (0, 3): 0.1},(0, -1): {(0, 1): 0.8999999999999999, (0, 3): 0.1}},(0, 3): {(1, 0): {(1, 3): 0.8999999999999999, (0, 2): 0.1},(0, 1): {(0, 3): 0.9999999999999999},(-1, 0): {(0, 3): 0.7999999999999999, (0, 2): 0.1, (1, 3): 0.1},(0, -1): {(0, 2): 0.7999999999999999, (0, 3): 0.2}},(1, 0): {(1, 0): {(2, 0): 0.8999999999999999, (1, 1): 0.1},(0, 1): {(1, 1): 0.8999999999999999, (1, 0): 0.1},(-1, 0): {(0, 0): 0.7, (1, 1): 0.2, (2, 0): 0.1},(0, -1): {(1, 0): 0.7999999999999999, (0, 0): 0.2}},(1, 1): {(1, 0): {(2, 1): 0.7999999999999999, (1, 0): 0.1, (0, 1): 0.1},(0, 1): {(1, 2): 0.7, (2, 1): 0.30000000000000004},(-1, 0): {(0, 1): 0.7, (2, 1): 0.1, (1, 0): 0.2},(0, -1): {(1, 0): 0.7999999999999999, (0, 1): 0.1, (2, 1): 0.1}},(1, 2): {(1, 0): {(2, 2): 0.7999999999999999, (1, 3): 0.1, (1, 1): 0.1},(0, 1): {(1, 3): 0.8999999999999999, (2, 2): 0.1},(-1, 0): {(0, 2): 0.8999999999999999, (1, 1): 0.1},(0, -1): {(1, 1): 0.7999999999999999, (2, 2): 0.1, (0, 2): 0.1}},(1, 3): {(1, 0): {(2, 3): 0.7999999999999999, (1, 3): 0.2},(0, 1): {(1, 3): 0.7999999999999999, (2, 3): 0.1, (0, 3): 0.1},(-1, 0): {(0, 3): 0.7, (2, 3): 0.1, (1, 2): 0.2},(0, -1): {(1, 2): 0.7999999999999999, (0, 3): 0.2}},(2, 0): {(1, 0): {(3, 0): 0.8999999999999999, (2, 0): 0.1},(0, 1): {(2, 1): 0.7999999999999999, (3, 0): 0.1, (1, 0): 0.1},(-1, 0): {(1, 0): 0.7, (2, 0): 0.2, (2, 1): 0.1},(0, -1): {(2, 0): 0.7, (2, 1): 0.2, (1, 0): 0.1}},(2, 1): {(1, 0): {(3, 1): 0.7999999999999999, (1, 1): 0.2},(0, 1): {(2, 2): 0.7, (1, 1): 0.1, (3, 1): 0.2},(-1, 0): {(1, 1): 0.7, (2, 0): 0.1, (2, 2): 0.1, (3, 1): 0.1},(0, -1): {(2, 0): 0.7, (1, 1): 0.2, (3, 1): 0.1}},(2, 2): {(1, 0): {(3, 2): 0.7, (1, 2): 0.1, (2, 1): 0.2},(0, 1): {(2, 3): 0.7999999999999999, (2, 1): 0.2},(-1, 0): {(1, 2): 0.7999999999999999, (2, 1): 0.1, (3, 2): 0.1},(0, -1): {(2, 1): 0.7999999999999999, (1, 2): 0.1, (3, 2): 0.1}},(2, 3): {(1, 0): {(3, 3): 0.7, (2, 3): 0.2, (2, 2): 0.1},(0, 1): {(2, 3): 0.7999999999999999, (2, 2): 0.1, (3, 3): 0.1},(-1, 0): {(1, 3): 0.8999999999999999, (2, 3): 0.1},(0, -1): {(2, 2): 0.7, (3, 3): 0.1, (1, 3): 0.1, (2, 3): 0.1}},(3, 0): {(1, 0): {(3, 0): 0.7, (3, 1): 0.1, (2, 0): 0.2},(0, 1): {(3, 1): 0.7999999999999999, (2, 0): 0.2},(-1, 0): {(2, 0): 0.7999999999999999, (3, 0): 0.2},(0, -1): {(3, 0): 0.7999999999999999, (2, 0): 0.1, (3, 1): 0.1}},(3, 1): {(1, 0): {(3, 1): 0.8999999999999999, (3, 2): 0.1},(0, 1): {(3, 2): 0.7, (2, 1): 0.2, (3, 0): 0.1},(-1, 0): {(2, 1): 0.7999999999999999, (3, 0): 0.1, (3, 1): 0.1},(0, -1): {(3, 0): 0.7999999999999999, (2, 1): 0.2}},(3, 2): {(1, 0): {(3, 2): 0.7999999999999999, (3, 1): 0.1, (2, 2): 0.1},(0, 1): {(3, 3): 0.7, (3, 2): 0.2, (2, 2): 0.1},(-1, 0): {(2, 2): 0.9999999999999999},(0, -1): {(3, 1): 0.7999999999999999, (3, 3): 0.1, (3, 2): 0.1}},(3, 3): {(1, 0): {(3, 3): 0.7999999999999999, (3, 2): 0.2},(0, 1): {(3, 3): 0.7999999999999999, (3, 2): 0.2},(-1, 0): {(2, 3): 0.7999999999999999, (3, 2): 0.1, (3, 3): 0.1},(0, -1): {(3, 2): 0.7999999999999999, (2, 3): 0.2}}}
-    rewardTableProb = {(0, 0): {(1, 0): {(1, 0): -1, (0, 1): -1, (0, 0): -1},(0, 1): {(0, 1): -1, (1, 0): -1},(-1, 0): {(0, 0): -1, (1, 0): -1, (0, 1): -1},(0, -1): {(0, 0): -1, (1, 0): -1, (0, 1): -1}},(0, 1): {(1, 0): {(1, 1): -1, (0, 1): -1, (0, 2): -1},(0, 1): {(0, 2): -1, (0, 0): -1},(-1, 0): {(0, 1): -1, (0, 0): -1},(0, -1): {(0, 0): -1, (0, 2): -1, (0, 1): -1}},(0, 2): {(1, 0): {(1, 2): -1, (0, 1): -1},(0, 1): {(0, 3): -1, (0, 1): -1, (1, 2): -1},(-1, 0): {(0, 2): -1, (0, 1): -1, (1, 2): -1, (0, 3): -1},(0, -1): {(0, 1): -1, (0, 3): -1}},(0, 3): {(1, 0): {(1, 3): -1, (0, 2): -1},(0, 1): {(0, 3): -1},(-1, 0): {(0, 3): -1, (0, 2): -1, (1, 3): -1},(0, -1): {(0, 2): -1, (0, 3): -1}},(1, 0): {(1, 0): {(2, 0): -1, (1, 1): -1},(0, 1): {(1, 1): -1, (1, 0): -1},(-1, 0): {(0, 0): -1, (1, 1): -1, (2, 0): -1},(0, -1): {(1, 0): -1, (0, 0): -1}},(1, 1): {(1, 0): {(2, 1): -100, (1, 0): -100, (0, 1): -100},(0, 1): {(1, 2): -100, (2, 1): -100},(-1, 0): {(0, 1): -100, (2, 1): -100, (1, 0): -100},(0, -1): {(1, 0): -100, (0, 1): -100, (2, 1): -100}},(1, 2): {(1, 0): {(2, 2): -1, (1, 3): -1, (1, 1): -1},(0, 1): {(1, 3): -1, (2, 2): -1},(-1, 0): {(0, 2): -1, (1, 1): -1},(0, -1): {(1, 1): -1, (2, 2): -1, (0, 2): -1}},(1, 3): {(1, 0): {(2, 3): -1, (1, 3): -1},(0, 1): {(1, 3): -1, (2, 3): -1, (0, 3): -1},(-1, 0): {(0, 3): -1, (2, 3): -1, (1, 2): -1},(0, -1): {(1, 2): -1, (0, 3): -1}},(2, 0): {(1, 0): {(3, 0): -1, (2, 0): -1},(0, 1): {(2, 1): -1, (3, 0): -1, (1, 0): -1},(-1, 0): {(1, 0): -1, (2, 0): -1, (2, 1): -1},(0, -1): {(2, 0): -1, (2, 1): -1, (1, 0): -1}},(2, 1): {(1, 0): {(3, 1): -1, (1, 1): -1},(0, 1): {(2, 2): -1, (1, 1): -1, (3, 1): -1},(-1, 0): {(1, 1): -1, (2, 0): -1, (2, 2): -1, (3, 1): -1},(0, -1): {(2, 0): -1, (1, 1): -1, (3, 1): -1}},(2, 2): {(1, 0): {(3, 2): -1, (1, 2): -1, (2, 1): -1},(0, 1): {(2, 3): -1, (2, 1): -1},(-1, 0): {(1, 2): -1, (2, 1): -1, (3, 2): -1},(0, -1): {(2, 1): -1, (1, 2): -1, (3, 2): -1}},(2, 3): {(1, 0): {(3, 3): -1, (2, 3): -1, (2, 2): -1},(0, 1): {(2, 3): -1, (2, 2): -1, (3, 3): -1},(-1, 0): {(1, 3): -1, (2, 3): -1},(0, -1): {(2, 2): -1, (3, 3): -1, (1, 3): -1, (2, 3): -1}},(3, 0): {(1, 0): {(3, 0): -1, (3, 1): -1, (2, 0): -1},(0, 1): {(3, 1): -1, (2, 0): -1},(-1, 0): {(2, 0): -1, (3, 0): -1},(0, -1): {(3, 0): -1, (2, 0): -1, (3, 1): -1}},(3, 1): {(1, 0): {(3, 1): -1, (3, 2): 10},(0, 1): {(3, 2): 10, (2, 1): 10, (3, 0): 10},(-1, 0): {(2, 1): 10, (3, 0): 10, (3, 1): -1},(0, -1): {(3, 0): 10, (2, 1): 10}},(3, 2): {(1, 0): {(3, 2): -1, (3, 1): -1, (2, 2): -1},(0, 1): {(3, 3): -1, (3, 2): -1, (2, 2): -1},(-1, 0): {(2, 2): -1},(0, -1): {(3, 1): -1, (3, 3): -1, (3, 2): -1}},(3, 3): {(1, 0): {(3, 3): -1, (3, 2): -1},(0, 1): {(3, 3): -1, (3, 2): -1},(-1, 0): {(2, 3): -1, (3, 2): -1, (3, 3): -1},(0, -1): {(3, 2): -1, (2, 3): -1}}}
-    valueTableProb = {(0, 0): 0,(0, 1): 0,(0, 2): 0,(0, 3): 0,(1, 0): 0,(1, 1): 0,(1, 2): 0,(1, 3): 0,(2, 0): 0,(2, 1): 0,(2, 2): 0,(2, 3): 0,(3, 0): 0,(3, 1): 0,(3, 2): 0,(3, 3): 0}
+    from ExampleTables import rewardTableProb, transitionTableProb, valueTableProb
     convergenceTolerance = 10e-7
     gamma = .9
 
+    performVectorizedValueIteration = VectorizedValueIteration(transitionTableProb, rewardTableProb, convergenceTolerance, gamma, dict(valueTableProb), valueFloor=0)
+    vectorizedValuesProb, vectorizedPolicyProb = performVectorizedValueIteration()
     performValueIteration = ValueIteration(transitionTableProb, rewardTableProb, valueTableProb, convergenceTolerance, gamma)
     optimalValuesProb, policyTableProb = performValueIteration()
     print('optimalValuesProb: {}'.format(optimalValuesProb))
     print('policyTableProb: {}'.format(policyTableProb))
+    checkParity(optimalValuesProb, policyTableProb, vectorizedValuesProb, vectorizedPolicyProb, convergenceTolerance)
 
 
     """